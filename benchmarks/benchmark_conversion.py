@@ -0,0 +1,110 @@
+'''
+Times each stage of convert_states and the write of the NWB file on synthetic sessions of several scales.
+
+    python benchmarks/benchmark_conversion.py --scales small medium --output results.json
+    python benchmarks/benchmark_conversion.py --scales small medium --baseline results.json
+
+With --baseline, stages whose wall time or peak memory increase exceed the baseline by more than
+--tolerance (relative) are reported as regressions and the script exits with status 1.
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eln2nwb import convert2nwb
+from eln2nwb import instrumentation
+from eln2nwb import synthetic
+
+
+def run_conversion(params, output_dir, label):
+    params = dict(params)
+    params['profiler'] = instrumentation.Profiler()
+    nwbfile = convert2nwb.convert_states(params)
+    with params['profiler'].stage('write'):
+        convert2nwb.save_nwbfile(nwbfile, os.path.join(output_dir, '{}.nwb'.format(label)))
+    params['movie_file'].close()
+    return params['profiler'].report()
+
+
+def run_conversion_in_process(params, output_dir, label):
+    # Memory that generating the session or an earlier run still holds would count for the stages of the next run,
+    # so every conversion runs in a fresh process (the peak RSS is reset per stage, see instrumentation.Profiler)
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(run_conversion, params, output_dir, label).result()
+
+
+def run_benchmarks(l_scales, data_dir):
+    d_results = {}
+    for scale in l_scales:
+        session_dir = os.path.join(data_dir, scale)
+        params = synthetic.generate_session(session_dir, **synthetic.SCALES[scale])
+        params['cache_dir'] = os.path.join(session_dir, 'cache')
+        # First run parses all inputs, the second one reuses the sidecars and caches
+        d_results[scale] = {'cold': run_conversion_in_process(params, session_dir, 'cold'),
+                            'warm': run_conversion_in_process(params, session_dir, 'warm')}
+        for run, report in d_results[scale].items():
+            print('{} ({}): {:.2f} s'.format(scale, run, report['total_wall_time_s']))
+            for stage in report['stages']:
+                print('    {:<20} {:8.3f} s {:10.1f} MB'.format(stage['stage'], stage['wall_time_s'], (stage['peak_rss_delta_bytes'] or 0) / 1e6))
+    return d_results
+
+
+def find_regressions(d_results, d_baseline, tolerance):
+    l_regressions = []
+    for scale, d_runs in d_results.items():
+        for run, report in d_runs.items():
+            if scale not in d_baseline or run not in d_baseline[scale]:
+                continue
+            d_baseline_stages = {stage['stage']: stage for stage in d_baseline[scale][run]['stages']}
+            for stage in report['stages']:
+                baseline_stage = d_baseline_stages.get(stage['stage'])
+                if baseline_stage is None:
+                    continue
+                for key in ['wall_time_s', 'peak_rss_delta_bytes']:
+                    if stage[key] is None or baseline_stage[key] is None:
+                        continue
+                    # Small absolute values are dominated by noise
+                    minimum = 0.05 if key == 'wall_time_s' else 10e6
+                    if stage[key] > max(baseline_stage[key], minimum) * (1 + tolerance):
+                        l_regressions.append('{} ({}), {}: {} = {:.3g} (baseline: {:.3g})'.format(
+                            scale, run, stage['stage'], key, stage[key], baseline_stage[key]))
+    return l_regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the conversion pipeline on synthetic data')
+    parser.add_argument('--scales', nargs='+', default=['small'], choices=list(synthetic.SCALES.keys()))
+    parser.add_argument('--data-dir', default=None, help='directory for the synthetic sessions (default: temporary directory)')
+    parser.add_argument('--output', default=None, help='.json file to which the results are written')
+    parser.add_argument('--baseline', default=None, help='.json file with the results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative increase that counts as regression')
+    args = parser.parse_args(argv)
+
+    if args.data_dir is None:
+        with tempfile.TemporaryDirectory() as data_dir:
+            d_results = run_benchmarks(args.scales, data_dir)
+    else:
+        d_results = run_benchmarks(args.scales, args.data_dir)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(d_results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            d_baseline = json.load(f)
+        l_regressions = find_regressions(d_results, d_baseline, args.tolerance)
+        for regression in l_regressions:
+            print('REGRESSION: {}'.format(regression))
+        return 1 if len(l_regressions) > 0 else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# Bump whenever the content of converted NWB files changes, so that cached conversions are redone
+__version__ = '0.1.0'
@@ -0,0 +1,63 @@
+import argparse
+import sys
+
+from eln2nwb import batch
+from eln2nwb import eln2widget
+from eln2nwb import convert2nwb
+from eln2nwb import storage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m eln2nwb', description='Convert DCL datasets into the NWB:N format')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help='convert all sessions listed in a manifest')
+    convert_parser.add_argument('manifest', help='.csv or .json file with the columns: {}'.format(', '.join(batch.MANIFEST_COLUMNS)))
+    convert_parser.add_argument('--output-dir', default='.', help='directory in which the NWB files are saved')
+    convert_parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    convert_parser.add_argument('--login', default='ELN_login.txt', help='file with the labfolder username and password')
+    convert_parser.add_argument('--cache-dir', default=None, help='directory for cached intermediate results')
+    convert_parser.add_argument('--force', action='store_true', help='convert all sessions, even if their inputs did not change')
+    convert_parser.add_argument('--link-movie', action='store_true', help='map the raw movie into the file (virtual dataset) instead of copying it')
+    convert_parser.add_argument('--summary-images', action='store_true', help='add mean, max and correlation images of the movie (one more pass over it)')
+    convert_parser.add_argument('--backend', default=storage.DEFAULT_BACKEND, choices=storage.BACKENDS,
+                                help='write NWB (HDF5) files or NWB-Zarr stores (requires hdmf-zarr)')
+    convert_parser.add_argument('--zarr-jobs', type=int, default=1, help='number of processes per session that write the chunks of a Zarr store')
+    convert_parser.add_argument('--export-hdf5', action='store_true', help='additionally export NWB-Zarr stores into NWB (HDF5) files')
+    convert_parser.add_argument('--no-validation', action='store_true', help='do not validate the written files')
+
+    consolidate_parser = subparsers.add_parser('consolidate', help='copy movies that are mapped from the raw data into their NWB files')
+    consolidate_parser.add_argument('nwb_files', nargs='+', help='NWB files that were converted with --link-movie')
+
+    export_parser = subparsers.add_parser('export', help='export NWB-Zarr stores into NWB (HDF5) files')
+    export_parser.add_argument('zarr_stores', nargs='+', help='NWB-Zarr stores that were converted with --backend zarr')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        l_sessions = batch.read_manifest(args.manifest)
+        username, password = eln2widget.read_login_credentials(args.login)
+        conversion_params = {'cache_dir': args.cache_dir, 'link_movie': args.link_movie, 'backend': args.backend,
+                             'summary_images': args.summary_images}
+        l_results = batch.run_batch(l_sessions, username, password, args.output_dir,
+                                    n_workers=args.workers, conversion_params=conversion_params, force=args.force,
+                                    number_of_jobs=args.zarr_jobs, export_hdf5=args.export_hdf5, validate=not args.no_validation)
+        batch.print_summary(l_results)
+        return 0 if all(result['status'] != 'failed' for result in l_results) else 1
+
+    elif args.command == 'consolidate':
+        for filepath in args.nwb_files:
+            if convert2nwb.consolidate_movie(filepath):
+                print('--> consolidated: {}'.format(filepath))
+            else:
+                print('--> already self-contained: {}'.format(filepath))
+        return 0
+
+    elif args.command == 'export':
+        for filepath in args.zarr_stores:
+            print('--> exported: {} -> {}'.format(filepath, convert2nwb.export_to_hdf5(filepath)))
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
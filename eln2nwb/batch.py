@@ -0,0 +1,150 @@
+import csv
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from eln2nwb import eln2widget
+from eln2nwb import convert2nwb
+from eln2nwb import fingerprint
+from eln2nwb import instrumentation
+from eln2nwb import validation
+
+
+# Columns of a batch manifest, the session_description has to be one of convert2nwb.SESSION_IDS
+MANIFEST_COLUMNS = ['file_dir', 'session_description', 'injection_eln_entry_id', 'implantation_eln_entry_id']
+
+
+def read_manifest(filepath):
+    '''
+    Reads the list of sessions to convert from a .csv file with the columns MANIFEST_COLUMNS,
+    or from a .json file that contains a list of objects with these keys.
+    :return: list of dicts, one per session
+    '''
+    with open(filepath, 'r') as f:
+        if filepath.endswith('.json'):
+            l_sessions = json.load(f)
+        else:
+            l_sessions = list(csv.DictReader(f))
+    for session in l_sessions:
+        l_missing = [column for column in MANIFEST_COLUMNS if not session.get(column)]
+        if len(l_missing) > 0:
+            raise ValueError('Session {} in {} lacks: {}'.format(session, filepath, ', '.join(l_missing)))
+    return l_sessions
+
+
+def create_session_params(session, username, password, conversion_params={}):
+    params = dict(conversion_params)
+    params['username'] = username
+    params['password'] = password
+    params['file_dir'] = session['file_dir']
+    params['session_description'] = session['session_description']
+    params['session_id'] = convert2nwb.SESSION_IDS[session['session_description']]
+    params['injection'] = {'eln_entry_id': session['injection_eln_entry_id']}
+    params['implantation'] = {'eln_entry_id': session['implantation_eln_entry_id']}
+    return params
+
+
+def convert_session(session, username, password, output_dir, conversion_params={}, force=False, number_of_jobs=1, export_hdf5=False):
+    '''
+    Retrieves the ELN metadata of one session, converts it and writes the NWB file to output_dir.
+    Sessions whose inputs did not change since the last conversion are skipped, and if only some
+    processing modules are affected, only these are converted and replaced in the existing file (unless force is True).
+    Runs in a worker process, so all errors are caught and reported in the returned result.
+    :param number_of_jobs: int, number of processes that write the movie chunks of an NWB-Zarr store (see convert2nwb.save_nwbfile)
+    :param export_hdf5: bool, whether an NWB-Zarr store is additionally exported into a single NWB (HDF5) file
+    :return: dict with 'file_dir', 'status' ('success', 'skipped' or 'failed'), 'filepath', 'error' and 'duration' (in s)
+    '''
+    start = time.time()
+    result = {'file_dir': session['file_dir'], 'status': 'failed', 'filepath': None, 'error': None}
+    params = create_session_params(session, username, password, conversion_params)
+    try:
+        params = eln2widget.States(params).get_metadata_injection()
+        params = eln2widget.States(params).get_metadata_implantation()
+        result['filepath'] = convert2nwb.get_output_filepath(params, output_dir)
+        d_fingerprints = fingerprint.get_fingerprints(params)
+        if force:
+            plan, l_changed = 'full', list(d_fingerprints.keys())
+        else:
+            plan, l_changed = fingerprint.get_conversion_plan(d_fingerprints, result['filepath'])
+        if plan == 'skip':
+            result['status'] = 'skipped'
+        else:
+            # For an update, only the replaced parts are converted
+            nwbfile = convert2nwb.convert_states(params, l_stages=l_changed if plan == 'update' else None)
+            plan = fingerprint.save_or_update(nwbfile, result['filepath'], d_fingerprints, plan, l_changed,
+                                              profiler=params['profiler'], number_of_jobs=number_of_jobs)
+            if export_hdf5 and convert2nwb.is_zarr_store(result['filepath']):
+                with params['profiler'].stage('export_hdf5'):
+                    result['export_filepath'] = convert2nwb.export_to_hdf5(result['filepath'])
+            params['profiler'].save(instrumentation.get_profile_filepath(result['filepath']))
+            result['profile'] = params['profiler'].report()
+            result['status'] = 'success'
+        result['plan'] = plan
+    except Exception:
+        result['error'] = traceback.format_exc()
+    finally:
+        convert2nwb.release_conversion(params)
+    result['duration'] = time.time() - start
+    return result
+
+
+def run_batch(l_sessions, username, password, output_dir, n_workers=None, conversion_params={}, force=False,
+              number_of_jobs=1, export_hdf5=False, validate=True):
+    '''
+    Converts all sessions in parallel, each worker process writes its NWB file directly.
+    Written files are validated in separate worker processes (see validation.submit_validation) while the
+    remaining sessions are converted, the findings are added to the results as 'findings'.
+    :param n_workers: int, number of worker processes, defaults to the number of CPUs
+    :param number_of_jobs, export_hdf5: see convert_session
+    :param validate: bool, whether the written files are validated
+    :return: list of results (see convert_session), in the order of l_sessions
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    l_results = [None] * len(l_sessions)
+    d_validation_futures = {}
+    with ProcessPoolExecutor(max_workers=len(validation.VALIDATION_CHECKS)) as validation_executor:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            d_futures = {executor.submit(convert_session, session, username, password, output_dir, conversion_params, force,
+                                         number_of_jobs, export_hdf5): idx
+                         for idx, session in enumerate(l_sessions)}
+            for future in as_completed(d_futures):
+                idx = d_futures[future]
+                try:
+                    l_results[idx] = future.result()
+                except Exception:
+                    # e.g. a crashed worker process
+                    l_results[idx] = {'file_dir': l_sessions[idx]['file_dir'], 'status': 'failed', 'filepath': None,
+                                      'error': traceback.format_exc(), 'duration': None}
+                if validate and l_results[idx]['status'] == 'success':
+                    d_validation_futures[idx] = validation.submit_validation(validation_executor, l_results[idx]['filepath'])
+                print('[{}/{}] {}: {}'.format(sum(result is not None for result in l_results), len(l_sessions),
+                                              l_results[idx]['status'], l_results[idx]['file_dir']))
+        for idx, d_check_futures in d_validation_futures.items():
+            l_results[idx]['findings'] = validation.collect_findings(d_check_futures)
+    return l_results
+
+
+def print_summary(l_results):
+    n_success = sum(result['status'] == 'success' for result in l_results)
+    n_skipped = sum(result['status'] == 'skipped' for result in l_results)
+    print('')
+    print('Converted {} of {} sessions successfully, {} were unchanged and skipped.'.format(n_success, len(l_results), n_skipped))
+    for result in l_results:
+        if result['status'] == 'success':
+            print('--> success ({}, {:.1f} s): {} -> {}'.format(result['plan'], result['duration'], result['file_dir'], result['filepath']))
+            if result.get('export_filepath') is not None:
+                print('    exported to: {}'.format(result['export_filepath']))
+            if result.get('findings') is not None:
+                d_counts = validation.count_findings(result['findings'])
+                print('    validation: {} errors, {} warnings, {} best practice violations'.format(
+                    d_counts['error'], d_counts['warning'], d_counts['best practice']))
+                for finding in result['findings']:
+                    if finding['severity'] == 'error':
+                        print('    error in {}: {}'.format(finding['location'], finding['message']))
+        elif result['status'] == 'skipped':
+            print('--> skipped (unchanged): {} -> {}'.format(result['file_dir'], result['filepath']))
+        else:
+            print('--> failed: {}'.format(result['file_dir']))
+            print(result['error'])
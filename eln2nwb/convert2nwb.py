@@ -7,240 +7,865 @@ import random
 import pandas as pd
 import numpy as np
 import h5py
-import math
 import os
+import glob
+import shutil
 
 from skimage import io
-from skimage.draw import polygon
 
 #import matplotlib.pyplot as plt
 
 #from nwbwidgets import nwb2widget
 
-from pynwb import NWBFile, TimeSeries, NWBHDF5IO
+from pynwb import NWBFile, TimeSeries, NWBHDF5IO, ProcessingModule
 from pynwb.file import Subject
 from pynwb.device import Device
 from pynwb.behavior import SpatialSeries, Position, BehavioralEpochs
-from pynwb.ophys import TwoPhotonSeries, OpticalChannel, ImageSegmentation, Fluorescence
+from pynwb.ophys import TwoPhotonSeries, OpticalChannel, ImageSegmentation, Fluorescence, DfOverF
+from pynwb.epoch import TimeIntervals
+from pynwb.base import Images
+from pynwb.image import GrayscaleImage
+
+from hdmf.data_utils import GenericDataChunkIterator, DataIO
+from hdmf.backends.hdf5.h5_utils import H5DataIO
+from hdmf.common import VectorData
+
+from eln2nwb import storage
+from eln2nwb import rois
+from eln2nwb import sidecar
+from eln2nwb import timebase
+from eln2nwb.timebase import find_nearest
+from eln2nwb import instrumentation
+from eln2nwb import summary_images
+from eln2nwb import dff
+
+
+DEFAULT_CONVERSION_PARAMS = {'stream_movie': True,
+                             'movie_buffer_gb': 1.0,
+                             'roi_mask_type': 'image',
+                             'cache_dir': None,
+                             'sidecar_cache': True,
+                             'thermal_animal_id': '175_F4-37',
+                             'thermal_session_id': 'OF',
+                             'rate_tolerance': 1e-3,
+                             'link_movie': False,
+                             'summary_images': False,
+                             'dff': False,
+                             'dff_window_s': 30.0,
+                             'dff_percentile': 8.,
+                             'frame_alignment': True,
+                             'resample': False,
+                             'resample_method': 'linear',
+                             'backend': storage.DEFAULT_BACKEND}
+
+
+MOVIE_UNIT = 'millimeter'
+
+
+SESSION_IDS = {'open field': 'OF',
+               'elevated plus maze': 'EPM',
+               'conditioning day 1': 'CD1',
+               'conditioning day 2': 'CD2'}
+
+
+# Input files in the session directory: (glob pattern, fallback filename)
+INPUT_FILES = {'alldata_filepath': ('*_AllData.xls', '175_F7-49_201030_OF_AllData.xls'),
+               'movie_filepath': ('*_MC-1.h5', '175_F7-49_201030_OF_PP-1_PF-1_MC-1.h5'),
+               'thermal_filepath': ('States_ceiling_reduced.csv', 'States_ceiling_reduced.csv')}
+
+
+# Containers that can be replaced in an existing NWB file without rewriting the raw acquisition
+UPDATABLE_MODULES = ['behavior', 'cardiac', 'thermal']
+UPDATABLE_INTERVALS = ['behavioral_intervals']
+
+
+# Columns that are used from sheets of which not all columns are needed
+ALLDATA_COLUMNS = {'Tracking': ['Times', 'CenterG_X', 'CenterG_Y'],
+                   'HeartRate': ['Times', 'HeartRate']}
+
+
+# Sheets of the AllData workbook that each part of the NWB file is converted from.
+# The timestamps of the CaI traces align all recordings to the imaging frames.
+STAGE_SHEETS = {'acquisition': ['CAI - Traces'],
+                'ophys': ['CAI - ROIS', 'CAI - Traces'],
+                'behavior': ['Tracking', 'CAI - Traces'],
+                'behavioral_intervals': ['Behaviour', 'CAI - Traces'],
+                'cardiac': ['HeartRate', 'CAI - Traces'],
+                'thermal': ['CAI - Traces']}
+
+
+def get_param(params, key):
+    return params.get(key, DEFAULT_CONVERSION_PARAMS[key])
+
+
+class SaveCancelled(Exception):
+    pass
+
+
+class MovieDataChunkIterator(GenericDataChunkIterator):
+    '''
+    Iterates block-wise over the frames of an open h5py dataset (e.g. f['mov']), so that the
+    whole movie can be written without loading it into memory.
+    While writing, progress_callback (if set) is called with the number of bytes of each block, and
+    setting cancel_event (a threading.Event) aborts the write with SaveCancelled.
+    :param dataset: h5py.Dataset, the raw calcium imaging movie (frames x height x width)
+    :param buffer_gb: float, maximum size of one block of frames that is held in memory
+    '''
+    def __init__(self, dataset, **kwargs):
+        self.dataset = dataset
+        self.iterator_kwargs = kwargs
+        self.progress_callback = None
+        self.cancel_event = None
+        super().__init__(**kwargs)
+
+    def reset(self):
+        # Iterators are exhausted after one write, e.g. a cancelled save has to start over
+        GenericDataChunkIterator.__init__(self, **self.iterator_kwargs)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.dataset.shape)) * self.dataset.dtype.itemsize
+
+    def __next__(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise SaveCancelled('Writing the movie was cancelled')
+        data_chunk = super().__next__()
+        if self.progress_callback is not None:
+            self.progress_callback(data_chunk.data.nbytes)
+        return data_chunk
+
+    def _to_dict(self):
+        # Iterators are pickled by file and dataset name for parallel writes to Zarr (see save_nwbfile)
+        return {'filepath': self.dataset.file.filename, 'dataset_name': self.dataset.name, 'iterator_kwargs': self.iterator_kwargs}
+
+    @staticmethod
+    def _from_dict(dictionary):
+        dataset = h5py.File(dictionary['filepath'], 'r')[dictionary['dataset_name']]
+        return MovieDataChunkIterator(dataset, **dictionary['iterator_kwargs'])
+
+    def __getitem__(self, selection):
+        # Frames can be read without consuming the iterator, e.g. when the NWBFile is inspected before saving
+        return self.dataset[selection]
+
+    @property
+    def shape(self):
+        return self.dataset.shape
 
-def find_nearest(array,value):
-    idx = np.searchsorted(array, value, side="left")
-    if idx > 0 and (idx == len(array) or math.fabs(value - array[idx-1]) < math.fabs(value - array[idx])):
-        return idx-1
-    else:
-        return idx
-    
-def take_first(elem):
-    return elem[0]
-
-
-def convert_states(params):
-    
-    
-    file_dir = params['file_dir']
-
-    # Tracking, scored behavioral events, ROI contours, fluorescence traces
-    d_dfs = pd.read_excel(file_dir + '175_F7-49_201030_OF_AllData.xls', sheet_name=None)
-    # Raw calcium imaging movie
-    f = h5py.File(file_dir + '175_F7-49_201030_OF_PP-1_PF-1_MC-1.h5', 'r')
-    #img_stack = io.imread('175_F7-49_201030_OF_PP.tiff')
-
-    # For dummy thermal trace:
-    df_states = pd.read_csv(file_dir + 'States_ceiling_reduced.csv', index_col=0)
-
-
-    l_ROI_IDs = [elem[:-2] for elem in d_dfs['CAI - ROIS'].columns[::2]]
-    l_ROI_masks = []
-
-    for ROI_ID in l_ROI_IDs:
-
-        x = d_dfs['CAI - ROIS']['{}_X'.format(ROI_ID)].values
-        last_idx = np.where(~np.isnan(x))[0][-1] + 1
-        x = x[:last_idx]
-        y = d_dfs['CAI - ROIS']['{}_Y'.format(ROI_ID)].values[:last_idx]
-        xx, yy = polygon(x,y)
-        ROI_mask = np.zeros((348, 385))
-        ROI_mask[xx, yy] = 1
-        l_ROI_masks.append((ROI_ID, ROI_mask))
-
-    
-    x = d_dfs['Tracking']['CenterG_X'].values
-    y = d_dfs['Tracking']['CenterG_Y'].values
-
-    times = d_dfs['Tracking']['Times'].values
+    def _get_data(self, selection):
+        return self.dataset[selection]
 
+    def _get_maxshape(self):
+        return self.dataset.shape
 
-    position_data = np.array((x,y)).T
-    position_times = d_dfs['Tracking']['Times'].values
+    def _get_dtype(self):
+        return self.dataset.dtype
 
 
-    l_behaviors = [elem[:elem.index('_')] for elem in d_dfs['Behaviour'].columns[::2]]
-
-    l_behavioral_time_intervals = []
-
-    for behavior in l_behaviors:
-        behavior_id = l_behaviors.index(behavior) +1
-        df_temp = d_dfs['Behaviour'][['{}_1'.format(behavior), '{}_2'.format(behavior)]].copy()
-        for i in range(df_temp.shape[0]):
-
-            start_time = df_temp.loc[i, '{}_1'.format(behavior)]
-            stop_time = df_temp.loc[i, '{}_2'.format(behavior)]
-            if start_time > 0: 
-                l_behavioral_time_intervals.append((start_time, stop_time, behavior))         
-            else:
-                continue
-
-    l_behavioral_time_intervals.sort(key=take_first)
-
-    
-    tz = pytz.timezone('Europe/Berlin')
-    N = 12
-    
-    surgery_injection = 'Virus injection on {} by {} (steretaxic coordinates: AP: {}, ML: {}, DV: {} [units: mm])'.format(params['injection']['date'],
-                                                                                                                          params['injection']['experimenter'],
-                                                                                                                          params['injection']['AP'],
-                                                                                                                          params['injection']['ML'], 
-                                                                                                                          params['injection']['DV'])
-    surgery_implantation = 'GRIN-lense implantation on {} by {} (steretaxic coordinates: AP: {}, ML: {}, DV: {} [units: mm])'.format(params['implantation']['date'],
-                                                                                                                          params['implantation']['experimenter'],
-                                                                                                                          params['implantation']['AP'],
-                                                                                                                          params['implantation']['ML'], 
-                                                                                                                          params['implantation']['DV'])
-    surgery_string = surgery_injection + surgery_implantation
-    if params['injection']['experimenter'] != params['implantation']['experimenter']:
-        l_experimenter = [params['injection']['experimenter'], params['implantation']['experimenter'], 'Dr. Jérémy Signoret-Genest', 'Prof. Dr. Philip Tovote']
+def wrap_movie(dataset, params):
+    if get_param(params, 'link_movie'):
+        if storage.get_backend(params) != 'hdf5':
+            raise ValueError('link_movie requires the hdf5 backend')
+        # Written as external link to the raw movie, so no movie data is copied. save_nwbfile replaces the link by
+        # a virtual dataset, which can hold the attributes of the series data (see replace_movie_link and consolidate_movie)
+        return H5DataIO(data=dataset, link_data=True)
+    if get_param(params, 'stream_movie'):
+        options = storage.get_storage_options(params, 'CaI') or {}
+        chunk_shape = storage.get_chunk_shape(options.get('chunks'), dataset.shape, dataset.dtype)
+        movie = MovieDataChunkIterator(dataset, buffer_gb=get_param(params, 'movie_buffer_gb'), chunk_shape=chunk_shape)
     else:
-        l_experimenter = [params['injection']['experimenter'], 'Dr. Jérémy Signoret-Genest', 'Prof. Dr. Philip Tovote']
-    
-    nwbfile = NWBFile(
-        session_description = params['session_description'],
-        session_id = params['session_id'],
-        surgery = surgery_string,
-        virus = '{}, source: in-house production'.format(params['injection']['viral_construct']),
-        identifier=''.join(random.choices(string.ascii_uppercase + string.digits, k=N)),
-        session_start_time=datetime.datetime(2020,10,30,9,30, tzinfo=tz),
-        experimenter = l_experimenter,
-        lab = 'Defense Circuits Lab',
-        institution = 'University Hospital Wuerzburg, Institute of Clinical Neurobiology'
-    )
+        movie = dataset[:]
+    return storage.wrap_data(movie, 'CaI', params)
+
+
+def get_source_filepath(filename, filepath):
+    # Relative paths of linked files are relative to the directory of the linking file
+    if os.path.isabs(filename):
+        return filename
+    return os.path.join(os.path.dirname(os.path.abspath(filepath)), filename)
+
+
+def get_linked_movie_attributes(io, nwbfile):
+    # Attributes of the movie data that could not be written to its external link (see wrap_movie)
+    if 'CaI' not in nwbfile.acquisition:
+        return None
+    data = nwbfile.acquisition['CaI'].data
+    if not isinstance(data, H5DataIO) or not data.link_data:
+        return None
+    return dict(io.manager.get_builder(nwbfile.acquisition['CaI'])['data'].attributes)
+
+
+def replace_movie_link(filepath, attributes, dataset_path='acquisition/CaI/data'):
+    '''
+    Replaces the external link to the raw movie in an NWB file by a virtual dataset that maps the same data,
+    so that the file stays small, but the attributes of the series data (e.g. its unit) are stored in it.
+    :param attributes: dict, attributes of the movie data (see get_linked_movie_attributes)
+    '''
+    with h5py.File(filepath, 'a') as h5file:
+        link = h5file.get(dataset_path, getlink=True)
+        if not isinstance(link, h5py.ExternalLink):
+            return
+        with h5py.File(get_source_filepath(link.filename, filepath), 'r') as source:
+            shape, dtype = source[link.path].shape, source[link.path].dtype
+        layout = h5py.VirtualLayout(shape=shape, dtype=dtype)
+        layout[...] = h5py.VirtualSource(link.filename, link.path, shape=shape)
+        del h5file[dataset_path]
+        dataset = h5file.create_virtual_dataset(dataset_path, layout)
+        for key, value in attributes.items():
+            dataset.attrs[key] = value
+
+
+def get_movie_source(h5file, dataset_path):
+    # File and dataset path of the raw movie that the NWB file maps (virtual dataset) or links to, or None
+    link = h5file.get(dataset_path, getlink=True)
+    if isinstance(link, h5py.ExternalLink):
+        return link.filename, link.path
+    if dataset_path in h5file and h5file[dataset_path].is_virtual:
+        virtual_source = h5file[dataset_path].virtual_sources()[0]
+        return virtual_source.file_name, virtual_source.dset_name
+    return None
+
+
+def consolidate_movie(filepath, params={}, dataset_path='acquisition/CaI/data'):
+    '''
+    Replaces the virtual dataset (or, in files of earlier versions, the external link) that maps the raw movie in an
+    NWB file that was converted with params['link_movie'] by a copy of the movie, so that the file becomes
+    self-contained. The movie is copied block-wise and stored according to the storage policy.
+    :param filepath: string, path to the NWB file
+    :param params: dict, conversion parameters (e.g. 'storage_policy' and 'movie_buffer_gb')
+    :return: bool, False if the movie was not mapped from another file (i.e. the file was already self-contained)
+    '''
+    with h5py.File(filepath, 'a') as h5file:
+        movie_source = get_movie_source(h5file, dataset_path)
+        if movie_source is None:
+            return False
+        source_filename, source_path = movie_source
+        # Attributes of TimeSeries data cannot be stored on a link, for files with links these are added here
+        attributes = {'unit': MOVIE_UNIT, 'conversion': 1.0, 'resolution': -1.0, 'offset': 0.0}
+        if isinstance(h5file.get(dataset_path, getlink=True), h5py.HardLink):
+            attributes = dict(h5file[dataset_path].attrs)
+        with h5py.File(get_source_filepath(source_filename, filepath), 'r') as source:
+            source_dataset = source[source_path]
+            data_io_kwargs = storage.get_data_io_kwargs(params, 'CaI', source_dataset.shape, source_dataset.dtype) or {}
+            data_io_kwargs.pop('allow_plugin_filters', None)
+            # Copied next to the link first, so that an interrupted copy leaves the link intact
+            dataset = h5file.create_dataset(dataset_path + '_consolidating', shape=source_dataset.shape,
+                                            dtype=source_dataset.dtype, **data_io_kwargs)
+            frame_nbytes = int(np.prod(source_dataset.shape[1:])) * source_dataset.dtype.itemsize
+            n_frames_per_block = max(int(get_param(params, 'movie_buffer_gb') * 1e9 // max(frame_nbytes, 1)), 1)
+            for start in range(0, source_dataset.shape[0], n_frames_per_block):
+                stop = min(start + n_frames_per_block, source_dataset.shape[0])
+                dataset[start:stop] = source_dataset[start:stop]
+        for key, value in attributes.items():
+            dataset.attrs[key] = value
+        del h5file[dataset_path]
+        h5file.move(dataset_path + '_consolidating', dataset_path)
+    return True
+
+
+def get_timing_kwargs(timestamps, params, shared_timestamps=None):
+    '''
+    Returns the timing arguments for a TimeSeries: starting_time and rate if the timestamps are uniformly
+    sampled within params['rate_tolerance'] (fraction of a sampling period; None disables the detection),
+    else a link to a series in shared_timestamps with identical timestamps, or else the explicit timestamps.
+    '''
+    if get_param(params, 'rate_tolerance') is not None:
+        regular_rate = timebase.get_regular_rate(timestamps, get_param(params, 'rate_tolerance'))
+        if regular_rate is not None:
+            return {'starting_time': regular_rate[0], 'rate': regular_rate[1]}
+    if shared_timestamps is not None and shared_timestamps.get_series(timestamps) is not None:
+        return {'timestamps': shared_timestamps.get_series(timestamps)}
+    return {'timestamps': storage.wrap_data(timestamps, 'timestamps', params)}
+
+
+def get_input_filepaths(params):
+    '''
+    Locates the input files of a session in params['file_dir'], unless their paths are given in params.
+    :return: dict with the keys of INPUT_FILES
+    '''
+    d_filepaths = {}
+    for key, (pattern, fallback_filename) in INPUT_FILES.items():
+        if key in params:
+            d_filepaths[key] = params[key]
+        else:
+            l_matches = sorted(glob.glob(os.path.join(params['file_dir'], pattern)))
+            if len(l_matches) > 0:
+                d_filepaths[key] = l_matches[0]
+            else:
+                d_filepaths[key] = os.path.join(params['file_dir'], fallback_filename)
+    return d_filepaths
+
+
+def read_thermal_rows(params, thermal_filepath):
+    # For dummy thermal trace: States_ceiling_reduced.csv holds the recordings of all animals and sessions
+    d_thermal_filters = {'Animal_ID': get_param(params, 'thermal_animal_id'), 'Session': get_param(params, 'thermal_session_id')}
+    if get_param(params, 'sidecar_cache'):
+        return sidecar.read_partitioned_csv(thermal_filepath, d_thermal_filters, ['Times', 'Temperature'],
+                                            cache_dir=get_param(params, 'cache_dir'))
+    df_states = pd.read_csv(thermal_filepath, index_col=0)
+    match = (df_states['Session'] == d_thermal_filters['Session']) & (df_states['Animal_ID'] == d_thermal_filters['Animal_ID'])
+    return df_states.loc[match, ['Times', 'Temperature']]
+
+
+def get_output_filepath(params, output_dir):
+    # NWB-Zarr stores are directories named like the NWB file plus .zarr
+    extension = '.nwb.zarr' if storage.get_backend(params) == 'zarr' else '.nwb'
+    return os.path.join(output_dir, '{}_{}{}'.format(params['injection']['mouse_id'], params['session_id'], extension))
+
+
+def is_zarr_store(filepath):
+    return filepath.rstrip('/').endswith('.zarr')
+
+
+def get_movie_iterator(nwbfile):
+    # Returns the MovieDataChunkIterator of the CaI movie, or None if the movie is not streamed
+    if 'CaI' not in nwbfile.acquisition:
+        return None
+    data = nwbfile.acquisition['CaI'].data
+    if isinstance(data, DataIO):
+        data = data.data
+    if isinstance(data, MovieDataChunkIterator):
+        return data
+    return None
+
+
+def save_nwbfile(nwbfile, filepath, number_of_jobs=1):
+    '''
+    Writes nwbfile to an NWB (HDF5) file, or to an NWB-Zarr store if filepath ends with .zarr
+    (nwbfile then has to be converted with params['backend'] = 'zarr').
+    The file is written next to filepath (see get_temporary_filepath) and only replaces an existing file at
+    filepath once it was written completely, so a cancelled or failed save keeps the previous file.
+    :param number_of_jobs: int, number of processes that compress and write the chunks of the movie concurrently
+                           (Zarr only, progress and cancellation are then not reported back from the workers)
+    '''
+    movie_iterator = get_movie_iterator(nwbfile)
+    if movie_iterator is not None:
+        movie_iterator.reset()
+    temporary_filepath = get_temporary_filepath(filepath)
+    remove_path(temporary_filepath)
+    try:
+        if is_zarr_store(filepath):
+            from hdmf_zarr.nwb import NWBZarrIO
+            with NWBZarrIO(temporary_filepath, mode='w') as io:
+                io.write(nwbfile, number_of_jobs=number_of_jobs)
+        else:
+            with NWBHDF5IO(temporary_filepath, 'w') as io:
+                io.write(nwbfile)
+                movie_attributes = get_linked_movie_attributes(io, nwbfile)
+            if movie_attributes is not None:
+                replace_movie_link(temporary_filepath, movie_attributes)
+    except BaseException:
+        # Do not leave an incomplete file behind
+        remove_path(temporary_filepath)
+        raise
+    if os.path.isdir(filepath):
+        # Directories cannot be replaced atomically
+        shutil.rmtree(filepath)
+    os.replace(temporary_filepath, filepath.rstrip('/'))
+
+
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.isfile(path):
+        os.remove(path)
+
+
+def open_nwbfile(filepath):
+    # Opens a saved NWB file (or NWB-Zarr store) for lazy reading, the caller has to close the returned io
+    if is_zarr_store(filepath):
+        from hdmf_zarr.nwb import NWBZarrIO
+        return NWBZarrIO(filepath, mode='r')
+    return NWBHDF5IO(filepath, 'r')
+
+
+def release_conversion(params):
+    # Drops the in-memory NWBFile and closes the raw movie once the NWB file is saved, both can be read back from the file
+    params.pop('nwbfile', None)
+    if params.get('movie_file') is not None:
+        params.pop('movie_file').close()
+
+
+def export_to_hdf5(zarr_filepath, nwb_filepath=None):
+    '''
+    Exports an NWB-Zarr store into a single NWB (HDF5) file, e.g. as deliverable.
+    :param zarr_filepath: string, path to the NWB-Zarr store
+    :param nwb_filepath: string, path of the NWB file, defaults to zarr_filepath without .zarr
+    :return: string, path of the NWB file
+    '''
+    from hdmf_zarr.nwb import NWBZarrIO
+    if nwb_filepath is None:
+        nwb_filepath = zarr_filepath.rstrip('/')[:-len('.zarr')]
+    with NWBZarrIO(zarr_filepath, mode='r') as read_io:
+        with NWBHDF5IO(nwb_filepath, 'w') as export_io:
+            export_io.export(src_io=read_io, write_args={'link_data': False})
+    return nwb_filepath
+
+
+def check_self_contained(module, l_module_names):
+    # Linked timestamps of a replaced module must not point to series that are not written along with it
+    for container in module.children:
+        for series in [container] + list(getattr(container, 'children', [])):
+            linked = getattr(series, 'timestamps', None)
+            if isinstance(linked, TimeSeries):
+                parent = linked.parent
+                while parent is not None and not isinstance(parent, ProcessingModule):
+                    parent = parent.parent
+                if parent is None or parent.name not in l_module_names:
+                    raise ValueError('{} in module {} links to the timestamps of {}, which is not updated along with it'.format(series.name, module.name, linked.name))
+
+
+def get_temporary_filepath(filepath):
+    # Hidden file next to filepath (with the same extension), which replaces filepath once it was written completely
+    directory, filename = os.path.split(filepath.rstrip('/'))
+    return os.path.join(directory, '.saving_' + filename)
+
+
+def get_group_path(name):
+    # Absolute path of an updatable processing module or interval table in the file
+    if name in UPDATABLE_INTERVALS:
+        return '/intervals/{}'.format(name)
+    return '/processing/{}'.format(name)
+
+
+def is_in_groups(path, l_group_paths):
+    return any(path == group_path or path.startswith(group_path + '/') for group_path in l_group_paths)
+
+
+def get_incoming_links(filepath, l_group_paths):
+    '''
+    Finds links from outside of the given groups of an NWB (HDF5) file to objects inside of them, e.g. timestamps
+    of a series in the behavior module that link to those of the heart rate in the cardiac module.
+    :param l_group_paths: list of strings, absolute paths of groups, e.g. ['/processing/cardiac']
+    :return: list of (path of the link, path of its target)
+    '''
+    l_links = []
+
+    def visit(group):
+        for name in group:
+            link = group.get(name, getlink=True)
+            path = '{}/{}'.format(group.name.rstrip('/'), name)
+            if isinstance(link, h5py.SoftLink):
+                if is_in_groups(link.path, l_group_paths) and not is_in_groups(path, l_group_paths):
+                    l_links.append((path, link.path))
+            elif isinstance(link, h5py.HardLink) and isinstance(group[name], h5py.Group):
+                visit(group[name])
+
+    with h5py.File(filepath, 'r') as h5file:
+        visit(h5file)
+    return l_links
+
+
+def update_nwbfile(nwbfile, filepath, l_module_names=UPDATABLE_MODULES, l_interval_names=UPDATABLE_INTERVALS):
+    '''
+    Adds or replaces processing modules and interval tables of an existing NWB file with those of nwbfile,
+    without converting the rest of the file (e.g. the raw CaI movie) again. The containers are moved from nwbfile into the
+    existing file, so nwbfile cannot be saved as a whole afterwards. All checks are done before the file is changed,
+    and the file is updated in place, the replaced groups are restored if the write fails. If the update is interrupted,
+    the file has no fingerprints (see fingerprint.save_or_update), so it is converted again as a whole next time.
+    :param nwbfile: NWBFile, e.g. as returned by convert_states
+    :param filepath: string, path to the existing NWB file
+    :param l_module_names: list of strings, processing modules to replace (subset of UPDATABLE_MODULES)
+    :param l_interval_names: list of strings, interval tables to replace (subset of UPDATABLE_INTERVALS)
+    '''
+    for name in l_module_names:
+        if name not in UPDATABLE_MODULES:
+            raise ValueError('Processing module {} cannot be updated, choose from: {}'.format(name, ', '.join(UPDATABLE_MODULES)))
+        if name in nwbfile.processing:
+            check_self_contained(nwbfile.processing[name], l_module_names)
+    for name in l_interval_names:
+        if name not in UPDATABLE_INTERVALS:
+            raise ValueError('Interval table {} cannot be updated, choose from: {}'.format(name, ', '.join(UPDATABLE_INTERVALS)))
+    # Data that remains in the file must not link into the replaced groups
+    l_group_paths = [get_group_path(name) for name in list(l_module_names) + list(l_interval_names)]
+    l_incoming_links = get_incoming_links(filepath, l_group_paths)
+    if len(l_incoming_links) > 0:
+        raise ValueError('{} cannot be updated, because {} link to it'.format(
+            ', '.join(l_group_paths), ', '.join('{} ({})'.format(path, target) for path, target in l_incoming_links)))
+
+    # Only the replaced groups are backed up, they are restored if writing their replacements fails
+    backup_filepath = get_backup_filepath(filepath)
+    with h5py.File(filepath, 'r') as h5file, h5py.File(backup_filepath, 'w') as backup:
+        for group_path in l_group_paths:
+            if group_path in h5file:
+                h5file.copy(h5file[group_path], backup, name=group_path)
+    try:
+        # pynwb cannot remove containers from a file, so the outdated groups are unlinked with h5py first.
+        # Both happen while the file is open once, so that the space of the unlinked groups is reused.
+        with h5py.File(filepath, 'a') as h5file:
+            for group_path in l_group_paths:
+                if group_path in h5file:
+                    del h5file[group_path]
+            with NWBHDF5IO(mode='a', file=h5file) as io:
+                nwbfile_on_disk = io.read()
+                for name in l_module_names:
+                    if name in nwbfile.processing:
+                        module = nwbfile.processing[name]
+                        module.reset_parent()
+                        nwbfile_on_disk.add_processing_module(module)
+                for name in l_interval_names:
+                    if nwbfile.intervals is not None and name in nwbfile.intervals:
+                        time_intervals = nwbfile.intervals[name]
+                        time_intervals.reset_parent()
+                        nwbfile_on_disk.add_time_intervals(time_intervals)
+                io.write(nwbfile_on_disk)
+    except BaseException:
+        restore_groups(filepath, backup_filepath, l_group_paths)
+        raise
+    finally:
+        if os.path.isfile(backup_filepath):
+            os.remove(backup_filepath)
+
+
+def get_backup_filepath(filepath):
+    # Hidden HDF5 file next to filepath with the groups that update_nwbfile replaces
+    directory, filename = os.path.split(filepath)
+    return os.path.join(directory, '.updating_' + filename)
+
+
+def restore_groups(filepath, backup_filepath, l_group_paths):
+    # Replaces partially written groups by their backups (see update_nwbfile)
+    with h5py.File(filepath, 'a') as h5file, h5py.File(backup_filepath, 'r') as backup:
+        for group_path in l_group_paths:
+            if group_path in h5file:
+                del h5file[group_path]
+            if group_path in backup:
+                backup.copy(backup[group_path], h5file, name=group_path)
+
+
+def get_behavioral_intervals(df_behaviour):
+    '''
+    Reshapes the <behavior>_1 (start) / <behavior>_2 (stop) column pairs of the 'Behaviour' sheet
+    into one long array of scored intervals, sorted by start time. Rows without a positive start time are skipped.
+    :param df_behaviour: pandas.DataFrame, the 'Behaviour' sheet
+    :return: arrays of start times, stop times and behaviors
+    '''
+    l_behaviors = [elem[:elem.index('_')] for elem in df_behaviour.columns[::2]]
+    # Transposed, so that intervals are ordered by behavior first (as ties keep this order when sorting)
+    start_times = df_behaviour[['{}_1'.format(behavior) for behavior in l_behaviors]].to_numpy(dtype=float).T.ravel()
+    stop_times = df_behaviour[['{}_2'.format(behavior) for behavior in l_behaviors]].to_numpy(dtype=float).T.ravel()
+    behaviors = np.repeat(np.array(l_behaviors, dtype=object), df_behaviour.shape[0])
+    with np.errstate(invalid='ignore'):
+        valid = start_times > 0
+    start_times, stop_times, behaviors = start_times[valid], stop_times[valid], behaviors[valid]
+    order = np.argsort(start_times, kind='stable')
+    return start_times[order], stop_times[order], behaviors[order]
+
+
+def create_behavioral_intervals_table(start_times, stop_times, behaviors):
+    # All columns are set at once instead of adding the intervals row by row
+    columns = [VectorData(name='start_time', description='Start time of epoch, in seconds', data=start_times),
+               VectorData(name='stop_time', description='Stop time of epoch, in seconds', data=stop_times),
+               VectorData(name='behavior', description='type of behavior', data=behaviors.tolist())]
+    return TimeIntervals(name='behavioral_intervals', description='scored behavioral intervals',
+                         columns=columns, id=np.arange(len(start_times)))
+
+
+def create_frame_index_series(name, frame_timestamps, timestamps, params, shared_timestamps=None):
+    # Frame of the imaging movie that is nearest to each sample, so that traces can be sliced without searching timestamps
+    return TimeSeries(name, data=storage.wrap_data(find_nearest(frame_timestamps, timestamps), 'TimeSeries', params),
+                      unit='frame index', description='index of the nearest imaging frame (-1 where the sample time is NaN)',
+                      **get_timing_kwargs(timestamps, params, shared_timestamps))
+
+
+def convert_states(params, l_stages=None):
+    '''
+    Converts the session described by params into an NWBFile.
+    :param l_stages: list of strings, parts of the file that are converted (see STAGE_SHEETS), defaults to all of them.
+                     Used to update only some modules of an existing file (see fingerprint.save_or_update), as 'acquisition'
+                     and 'ophys' both require the CaI movie, they are only converted together.
+    '''
     
-    recording_day = date(2020, 10, 30)
-    dob = params['injection']['date_of_birth']
-    day_of_birth = date(int(dob[:4]), int(dob[5:7]), int(dob[8:]))
-    age = recording_day - day_of_birth
-
-    nwbfile.subject = Subject(
-        subject_id = params['injection']['mouse_id'],
-        age = 'P{}D'.format(str(age.days)), 
-        date_of_birth = datetime.datetime(int(dob[:4]), int(dob[5:7]), int(dob[8:]), tzinfo=tz),
-        #strain = 'B6J.129S6(FVB)-Slc17a6tm2(cre)Lowl/MwarJ',
-        description = 'Mouse #F{} of line {}'.format(params['injection']['mouse_id'][5:], params['injection']['mouse_id'][:3]),
-        genotype = params['injection']['genotype'],
-        species = 'Mus musculus', 
-        sex = params['injection']['sex']
-    )
+    # Wall time, CPU time, memory and I/O of each stage are recorded in params['profiler']
+    if params.get('profiler') is None:
+        params['profiler'] = instrumentation.Profiler()
+    profiler = params['profiler']
+    if l_stages is None:
+        l_stages = list(STAGE_SHEETS.keys())
+    convert_imaging = 'acquisition' in l_stages or 'ophys' in l_stages
+    if convert_imaging:
+        l_stages = list(l_stages) + [stage for stage in ['acquisition', 'ophys'] if stage not in l_stages]
     
-    from pynwb.epoch import TimeIntervals
-
-    time_interval_table = TimeIntervals('behavioral_intervals', description='scored behavioral intervals', id=None)
-    time_interval_table.add_column('behavior', description='type of behavior')
-
-    for elem in l_behavioral_time_intervals:
-        time_interval_table.add_interval(elem[0], elem[1], behavior=elem[2])   
+    d_filepaths = get_input_filepaths(params)
+
+    with profiler.stage('excel_load'):
+        # Tracking, scored behavioral events, ROI contours, fluorescence traces
+        # Sheets are only loaded when first accessed, with the columns that are used, and released once converted.
+        # Loading them is recorded for this stage wherever it happens.
+        l_sheets = [sheet_name for sheet_name in sidecar.ALLDATA_SHEETS if any(sheet_name in STAGE_SHEETS[stage] for stage in l_stages)]
+        workbook = sidecar.LazyWorkbook(d_filepaths['alldata_filepath'], l_sheets, columns=ALLDATA_COLUMNS,
+                                        cache_dir=get_param(params, 'cache_dir'), use_sidecar=get_param(params, 'sidecar_cache'),
+                                        profiler=profiler)
+        workbook.prepare()
+
+    if 'thermal' in l_stages:
+        with profiler.stage('thermal_load'):
+            df_thermal = read_thermal_rows(params, d_filepaths['thermal_filepath'])
+
+    if convert_imaging:
+        with profiler.stage('hdf5_open'):
+            # Raw calcium imaging movie, kept open until the NWB file has been written when streaming
+            f = h5py.File(d_filepaths['movie_filepath'], 'r')
+            params['movie_file'] = f
+            #img_stack = io.imread('175_F7-49_201030_OF_PP.tiff')
+
+        with profiler.stage('roi_rasterization'):
+            roi_masks = rois.rasterize_roi_sheet(workbook['CAI - ROIS'], cache_dir=get_param(params, 'cache_dir'))
+            workbook.release('CAI - ROIS')
+
+            l_ROI_IDs_included = []
+            l_ROI_IDs_excluded = []
+
+            for ROI_ID in range(len(roi_masks)):
+                if ROI_ID in [3, 4, 10, 12, 14, 16, 22, 25]:
+                    l_ROI_IDs_excluded.append(roi_masks.roi_ids[ROI_ID])
+                else:
+                    l_ROI_IDs_included.append(roi_masks.roi_ids[ROI_ID])
+
+    if 'behavioral_intervals' in l_stages:
+        with profiler.stage('interval_extraction'):
+            interval_start_times, interval_stop_times, interval_behaviors = get_behavioral_intervals(workbook['Behaviour'])
+            time_interval_table = create_behavioral_intervals_table(interval_start_times, interval_stop_times, interval_behaviors)
+            workbook.release('Behaviour')
+
+    with profiler.stage('metadata_assembly'):
+        tz = pytz.timezone('Europe/Berlin')
+        N = 12
         
-    timestamps = d_dfs['HeartRate']['Times'].values
-    data = d_dfs['HeartRate']['HeartRate'].values
-
-    heartrate_obj = TimeSeries('Heart rate recording', data=data, timestamps=timestamps, unit='beats per minute')
-    
-    
-    timestamps = df_states.loc[(df_states['Session'] == 'OF') & (df_states['Animal_ID'] == '175_F4-37'), 'Times'].values
-    temperature = df_states.loc[(df_states['Session'] == 'OF') & (df_states['Animal_ID'] == '175_F4-37'), 'Temperature'].values
-
-    temperature_obj = TimeSeries('Thermal recording', data=temperature, timestamps=timestamps, unit='degrees celsius')
-    
-    device = Device(name='Miniscope', description='NVista3.0', manufacturer='Inscopix, US')
-    nwbfile.add_device(device)
-    
-    optical_channel = OpticalChannel('my_optchan', 'description', 500.)
-    imaging_plane = nwbfile.create_imaging_plane('my_imgpln', optical_channel,
-                                                 description='{} (AP={}, ML={}, DV={})'.format(params['implantation']['target_region'],
-                                                                                               params['implantation']['AP'],
-                                                                                               params['implantation']['ML'],
-                                                                                               params['implantation']['DV']),
-                                                 device=device, excitation_lambda=475., imaging_rate=10., 
-                                                 indicator=params['injection']['viral_construct'][params['injection']['viral_construct'].index('GCaMP'):],
-                                                 location=params['implantation']['target_region'],
-                                                 unit='millimeter')
-    
-    image_series = TwoPhotonSeries(name='CaI', data=f['mov'][:200],
-                                   dimension=[385, 348],
-                                   imaging_plane=imaging_plane,
-                                   starting_frame=[0], format='tiff', starting_time=0.0, rate=1.0, unit='millimeter')
-    
-    nwbfile.add_acquisition(image_series)
-    
-    mod = nwbfile.create_processing_module('ophys', 'contains optical physiology processed data')
-    img_seg = ImageSegmentation()
-    mod.add(img_seg)
-    ps = img_seg.create_plane_segmentation('ROI segmentations',
-                                           imaging_plane, 'my_planeseg', image_series)
-
-    ID = 0
-    for ROI_ID in range(len(l_ROI_masks)):
-        if ROI_ID in [3, 4, 10, 12, 14, 16, 22, 25]:
-            continue
+        surgery_injection = 'Virus injection on {} by {} (steretaxic coordinates: AP: {}, ML: {}, DV: {} [units: mm])'.format(params['injection']['date'],
+                                                                                                                              params['injection']['experimenter'],
+                                                                                                                              params['injection']['AP'],
+                                                                                                                              params['injection']['ML'], 
+                                                                                                                              params['injection']['DV'])
+        surgery_implantation = 'GRIN-lense implantation on {} by {} (steretaxic coordinates: AP: {}, ML: {}, DV: {} [units: mm])'.format(params['implantation']['date'],
+                                                                                                                              params['implantation']['experimenter'],
+                                                                                                                              params['implantation']['AP'],
+                                                                                                                              params['implantation']['ML'], 
+                                                                                                                              params['implantation']['DV'])
+        surgery_string = surgery_injection + surgery_implantation
+        if params['injection']['experimenter'] != params['implantation']['experimenter']:
+            l_experimenter = [params['injection']['experimenter'], params['implantation']['experimenter'], 'Dr. Jérémy Signoret-Genest', 'Prof. Dr. Philip Tovote']
         else:
-            ps.add_roi(image_mask=l_ROI_masks[ROI_ID][1], id=ID)
-            ID = ID+ 1
-
-
-    l_ROI_IDs_included = []
-    l_ROI_IDs_excluded = []
-
-    for ROI_ID in range(len(l_ROI_masks)):
-        if ROI_ID in [3, 4, 10, 12, 14, 16, 22, 25]:
-            l_ROI_IDs_excluded.append(l_ROI_masks[ROI_ID][0])
-        else:
-            l_ROI_IDs_included.append(l_ROI_masks[ROI_ID][0])
+            l_experimenter = [params['injection']['experimenter'], 'Dr. Jérémy Signoret-Genest', 'Prof. Dr. Philip Tovote']
+        
+        nwbfile = NWBFile(
+            session_description = params['session_description'],
+            session_id = params['session_id'],
+            surgery = surgery_string,
+            virus = '{}, source: in-house production'.format(params['injection']['viral_construct']),
+            identifier=''.join(random.choices(string.ascii_uppercase + string.digits, k=N)),
+            session_start_time=datetime.datetime(2020,10,30,9,30, tzinfo=tz),
+            experimenter = l_experimenter,
+            lab = 'Defense Circuits Lab',
+            institution = 'University Hospital Wuerzburg, Institute of Clinical Neurobiology'
+        )
+        
+        recording_day = date(2020, 10, 30)
+        dob = params['injection']['date_of_birth']
+        day_of_birth = date(int(dob[:4]), int(dob[5:7]), int(dob[8:]))
+        age = recording_day - day_of_birth
+
+        nwbfile.subject = Subject(
+            subject_id = params['injection']['mouse_id'],
+            age = 'P{}D'.format(str(age.days)), 
+            date_of_birth = datetime.datetime(int(dob[:4]), int(dob[5:7]), int(dob[8:]), tzinfo=tz),
+            #strain = 'B6J.129S6(FVB)-Slc17a6tm2(cre)Lowl/MwarJ',
+            description = 'Mouse #F{} of line {}'.format(params['injection']['mouse_id'][5:], params['injection']['mouse_id'][:3]),
+            genotype = params['injection']['genotype'],
+            species = 'Mus musculus', 
+            sex = params['injection']['sex']
+        )
+        
+        if 'behavioral_intervals' in l_stages:
+            nwbfile.add_time_intervals(time_interval_table)
+        
+        if convert_imaging:
+            device = Device(name='Miniscope', description='NVista3.0', manufacturer='Inscopix, US')
+            nwbfile.add_device(device)
             
-    fl = Fluorescence()
-    mod.add(fl)
-
-    rt_region = ps.create_roi_table_region(description='all ROIs')
-    data_included = d_dfs['CAI - Traces'][l_ROI_IDs_included].values
-    data_excluded = d_dfs['CAI - Traces'][l_ROI_IDs_excluded].values
-    timestamps = d_dfs['CAI - Traces']['Times'].values
-    rrs = fl.create_roi_response_series('included', data=data_included, rois=rt_region, unit='lumens', timestamps=timestamps)    
-    
-    # Create a SpatialSeries that contains the data - extension of TimeSeries
-    spatial_series_obj = SpatialSeries(
-        name = 'SpatialSeries', 
-        description = '(x,y) position in {}'.format(params['session_description']),
-        data = position_data,
-        timestamps = position_times,   # if no timestamps are provided, session_start_time from file setup will be used - ?
-        reference_frame = '(0,0) is bottom left corner'
-    )
-
-    # Create a container "Position" that can contain multiple 
-    # SpatialSeries - e.g. if multiple trials are used? not sure though
-    position_obj = Position(spatial_series=spatial_series_obj) # name is set to 'Position' by default
-
-    # Create a "Processing_module" to store the behavioral data, 
-    # since it is not considered as raw due to preprocessing 
-    # by other alglorithms / softwares
-    behavior_module = nwbfile.create_processing_module(
-        name='behavior', 
-        description='processed behavioral data'
-    )
-
-    # Add the Processing_module to the NWB:N file
-    behavior_module.add(position_obj)    
-    
-    hr_mod = nwbfile.create_processing_module('cardiac', 'processed heart rate recording data')
-    hr_mod.add(heartrate_obj)
-    
-    temp_mod = nwbfile.create_processing_module('thermal', 'processed temperature recording data')
-    temp_mod.add(temperature_obj)
+            optical_channel = OpticalChannel('my_optchan', 'description', 500.)
+            imaging_plane = nwbfile.create_imaging_plane('my_imgpln', optical_channel,
+                                                         description='{} (AP={}, ML={}, DV={})'.format(params['implantation']['target_region'],
+                                                                                                       params['implantation']['AP'],
+                                                                                                       params['implantation']['ML'],
+                                                                                                       params['implantation']['DV']),
+                                                         device=device, excitation_lambda=475., imaging_rate=10., 
+                                                         indicator=params['injection']['viral_construct'][params['injection']['viral_construct'].index('GCaMP'):],
+                                                         location=params['implantation']['target_region'],
+                                                         unit='millimeter')
+        
+    # Series on the same clock link to the timestamps of the first series written with them
+    shared_timestamps = timebase.SharedTimestamps()
+
+    if convert_imaging:
+        with profiler.stage('movie_wrapping'):
+            # The fluorescence traces were extracted from the movie, so they share its clock
+            # Of the traces, only the included ROIs are loaded
+            df_traces = workbook.get('CAI - Traces', columns=['Times'] + l_ROI_IDs_included)
+            movie_timestamps = df_traces['Times'].values
+            if len(movie_timestamps) == f['mov'].shape[0]:
+                movie_timing_kwargs = get_timing_kwargs(movie_timestamps, params, shared_timestamps)
+            else:
+                movie_timing_kwargs = {'starting_time': 0.0, 'rate': 1.0}
+            image_series = TwoPhotonSeries(name='CaI', data=wrap_movie(f['mov'], params),
+                                           dimension=[385, 348],
+                                           imaging_plane=imaging_plane,
+                                           starting_frame=[0], format='tiff', unit=MOVIE_UNIT, **movie_timing_kwargs)
+            if len(movie_timestamps) == f['mov'].shape[0]:
+                shared_timestamps.register(movie_timestamps, image_series)
+            
+            nwbfile.add_acquisition(image_series)
+
+    with profiler.stage('trace_packing'):
+        if convert_imaging:
+            mod = nwbfile.create_processing_module('ophys', 'contains optical physiology processed data')
+            img_seg = ImageSegmentation()
+            mod.add(img_seg)
+            ps = img_seg.create_plane_segmentation('ROI segmentations',
+                                                   imaging_plane, 'my_planeseg', image_series)
+
+            ID = 0
+            for ROI_ID in range(len(roi_masks)):
+                if ROI_ID in [3, 4, 10, 12, 14, 16, 22, 25]:
+                    continue
+                else:
+                    if get_param(params, 'roi_mask_type') == 'pixel':
+                        ps.add_roi(pixel_mask=roi_masks.pixel_mask(ROI_ID), id=ID)
+                    else:
+                        ps.add_roi(image_mask=roi_masks.image_mask(ROI_ID), id=ID)
+                    ID = ID+ 1
+            if get_param(params, 'roi_mask_type') == 'pixel':
+                # ps['pixel_mask'] is the index of the ragged column, the pixels themselves are in its target
+                storage.set_column_storage(ps['pixel_mask'].target, 'pixel_mask', params, shape=(len(ps['pixel_mask'].target.data), ))
+            else:
+                storage.set_column_storage(ps['image_mask'], 'image_mask', params)
+
+            fl = Fluorescence()
+            mod.add(fl)
+
+            rt_region = ps.create_roi_table_region(description='all ROIs')
+            data_included = df_traces[l_ROI_IDs_included].values
+            rrs_timestamps = df_traces['Times'].values
+            rrs = fl.create_roi_response_series('included', data=storage.wrap_data(data_included, 'RoiResponseSeries', params), rois=rt_region,
+                                                unit='lumens', **get_timing_kwargs(rrs_timestamps, params, shared_timestamps))
+            shared_timestamps.register(rrs_timestamps, rrs)    
+            del df_traces
+        else:
+            # Without the traces, only their timestamps are needed to align the other recordings to the imaging frames
+            rrs_timestamps = workbook.get('CAI - Traces', columns=['Times'])['Times'].values
+        workbook.release('CAI - Traces')
+        
+        if 'cardiac' in l_stages:
+            heartrate_timestamps = workbook['HeartRate']['Times'].values
+            heartrate = workbook['HeartRate']['HeartRate'].values
+            workbook.release('HeartRate')
+
+            heartrate_obj = TimeSeries('Heart rate recording', data=storage.wrap_data(heartrate, 'TimeSeries', params),
+                                       unit='beats per minute', **get_timing_kwargs(heartrate_timestamps, params, shared_timestamps))
+            shared_timestamps.register(heartrate_timestamps, heartrate_obj)
+        
+        if 'thermal' in l_stages:
+            thermal_timestamps = df_thermal['Times'].values
+            temperature = df_thermal['Temperature'].values
+
+            temperature_obj = TimeSeries('Thermal recording', data=storage.wrap_data(temperature, 'TimeSeries', params),
+                                         unit='degrees celsius', **get_timing_kwargs(thermal_timestamps, params, shared_timestamps))
+            shared_timestamps.register(thermal_timestamps, temperature_obj)
+        
+        if 'behavior' in l_stages:
+            x = workbook['Tracking']['CenterG_X'].values
+            y = workbook['Tracking']['CenterG_Y'].values
+
+            position_data = np.array((x,y)).T
+            position_times = workbook['Tracking']['Times'].values
+            workbook.release('Tracking')
+
+            # Create a SpatialSeries that contains the data - extension of TimeSeries
+            spatial_series_obj = SpatialSeries(
+                name = 'SpatialSeries', 
+                description = '(x,y) position in {}'.format(params['session_description']),
+                data = storage.wrap_data(position_data, 'SpatialSeries', params),
+                reference_frame = '(0,0) is bottom left corner',
+                **get_timing_kwargs(position_times, params, shared_timestamps)
+            )
+            shared_timestamps.register(position_times, spatial_series_obj)
+
+            # Create a container "Position" that can contain multiple 
+            # SpatialSeries - e.g. if multiple trials are used? not sure though
+            position_obj = Position(spatial_series=spatial_series_obj) # name is set to 'Position' by default
+
+            # Create a "Processing_module" to store the behavioral data, 
+            # since it is not considered as raw due to preprocessing 
+            # by other alglorithms / softwares
+            behavior_module = nwbfile.create_processing_module(
+                name='behavior', 
+                description='processed behavioral data'
+            )
+
+            # Add the Processing_module to the NWB:N file
+            behavior_module.add(position_obj)    
+        
+        if 'cardiac' in l_stages:
+            hr_mod = nwbfile.create_processing_module('cardiac', 'processed heart rate recording data')
+            hr_mod.add(heartrate_obj)
+        
+        if 'thermal' in l_stages:
+            temp_mod = nwbfile.create_processing_module('thermal', 'processed temperature recording data')
+            temp_mod.add(temperature_obj)
+
+    if get_param(params, 'frame_alignment'):
+        with profiler.stage('frame_alignment'):
+            # The traces are sampled once per imaging frame, so their timestamps index the frames
+            if 'behavioral_intervals' in l_stages:
+                time_interval_table.add_column(name='start_frame', description='index of the imaging frame nearest to the start time',
+                                               data=find_nearest(rrs_timestamps, interval_start_times))
+                time_interval_table.add_column(name='stop_frame', description='index of the imaging frame nearest to the stop time',
+                                               data=find_nearest(rrs_timestamps, interval_stop_times))
+            if 'cardiac' in l_stages:
+                hr_mod.add(create_frame_index_series('Heart rate frame indices', rrs_timestamps, heartrate_timestamps, params, shared_timestamps))
+            if 'thermal' in l_stages:
+                temp_mod.add(create_frame_index_series('Thermal frame indices', rrs_timestamps, thermal_timestamps, params, shared_timestamps))
+
+    if get_param(params, 'resample'):
+        with profiler.stage('resampling'):
+            # Copies of the recordings on the timestamps of the fluorescence traces. These are stored with each copy (or as rate)
+            # rather than linked to the traces, so that the modules stay self-contained and can be updated on their own
+            method = get_param(params, 'resample_method')
+            description = 'resampled onto the timestamps of the CaI traces ({})'.format(method)
+            if 'cardiac' in l_stages:
+                hr_mod.add(TimeSeries('Heart rate resampled', unit='beats per minute', description=description,
+                                      data=storage.wrap_data(timebase.resample(heartrate_timestamps, heartrate, rrs_timestamps, method), 'TimeSeries', params),
+                                      **get_timing_kwargs(rrs_timestamps, params)))
+            if 'thermal' in l_stages:
+                temp_mod.add(TimeSeries('Thermal resampled', unit='degrees celsius', description=description,
+                                        data=storage.wrap_data(timebase.resample(thermal_timestamps, temperature, rrs_timestamps, method), 'TimeSeries', params),
+                                        **get_timing_kwargs(rrs_timestamps, params)))
+            if 'behavior' in l_stages:
+                position_obj.create_spatial_series(name='SpatialSeries resampled', reference_frame='(0,0) is bottom left corner',
+                                                   description='(x,y) position in {}, {}'.format(params['session_description'], description),
+                                                   data=storage.wrap_data(timebase.resample(position_times, position_data, rrs_timestamps, method), 'SpatialSeries', params),
+                                                   **get_timing_kwargs(rrs_timestamps, params))
+
+    if get_param(params, 'dff') and convert_imaging:
+        with profiler.stage('dff'):
+            window_size = dff.get_window_size(rrs_timestamps, get_param(params, 'dff_window_s'))
+            data_dff = dff.compute_dff(data_included, window_size, get_param(params, 'dff_percentile'))
+            dff_obj = DfOverF()
+            mod.add(dff_obj)
+            dff_obj.create_roi_response_series('included', data=storage.wrap_data(data_dff, 'RoiResponseSeries', params),
+                                               rois=ps.create_roi_table_region(description='all ROIs'), unit='n.a.',
+                                               description='dF/F with the {}th percentile of a running {} s window as baseline'.format(
+                                                   get_param(params, 'dff_percentile'), get_param(params, 'dff_window_s')),
+                                               **get_timing_kwargs(rrs_timestamps, params, shared_timestamps))
+
+    if get_param(params, 'summary_images') and convert_imaging:
+        with profiler.stage('summary_images'):
+            # Reference images for reviewers, computed in one chunked pass over the movie
+            mean_image, max_image, correlation_image = summary_images.compute_summary_images(f['mov'], get_param(params, 'movie_buffer_gb'))
+            images = Images(name='summary_images', description='summary images of the CaI movie',
+                            images=[GrayscaleImage(name='mean', data=mean_image, description='mean of all frames'),
+                                    GrayscaleImage(name='max', data=max_image, description='maximum projection of all frames'),
+                                    GrayscaleImage(name='correlation', data=correlation_image,
+                                                   description='local correlation image (mean correlation with the 8 neighboring pixels)')])
+            mod.add(images)
     
-    return nwbfile
\ No newline at end of file
+    return nwbfile
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+
+def get_window_size(timestamps, window_s):
+    # Number of samples that span window_s at the median sampling interval of the traces
+    if len(timestamps) < 2:
+        return 1
+    return max(int(round(window_s / np.median(np.diff(timestamps)))), 1)
+
+
+def compute_dff(traces, window_size, percentile=8., chunk_size=32):
+    '''
+    Computes dF/F = (F - F0) / F0 for all ROIs, with the baseline F0 as running percentile of each trace.
+    ROIs are processed in blocks of chunk_size columns, so that only the float32 result and one block of
+    intermediates are held in memory, even for long sessions with many ROIs.
+    :param traces: 2D array, fluorescence traces with the shape samples x ROIs
+    :param window_size: int, number of samples of the (centered) running window
+    :param percentile: float, percentile of the window that is used as baseline
+    :param chunk_size: int, number of ROIs that are processed at once
+    :return: 2D float32 array with the shape of traces, NaN where the baseline is 0
+    '''
+    dff = np.empty(traces.shape, dtype=np.float32)
+    for start in range(0, traces.shape[1], chunk_size):
+        stop = min(start + chunk_size, traces.shape[1])
+        block = np.asarray(traces[:, start:stop], dtype=np.float32)
+        baseline = pd.DataFrame(block).rolling(window_size, center=True, min_periods=1).quantile(percentile / 100.).to_numpy(dtype=np.float32)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            np.divide(block - baseline, baseline, out=dff[:, start:stop], where=baseline != 0)
+        dff[:, start:stop][baseline == 0] = np.nan
+    return dff
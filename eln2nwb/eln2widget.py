@@ -1,5 +1,37 @@
 from eln2nwb import labfolder as eln
 
+
+# Pooled labfolder clients of this process, shared by all States instances with the same configuration
+_CLIENTS = {}
+
+
+def get_client(base_url, use_verify, proxies):
+    key = (base_url, use_verify, tuple(sorted(proxies.items())))
+    if key not in _CLIENTS:
+        _CLIENTS[key] = eln.LabfolderClient(base_URL=base_url, use_verify=use_verify, proxies=proxies)
+    return _CLIENTS[key]
+
+
+def read_login_credentials(filepath='ELN_login.txt'):
+    '''
+    Reads the labfolder login from a text file with the lines 'username <username>' and 'password <password>'.
+    :return: username, password
+    '''
+    username, password = None, None
+    with open(filepath, 'r') as f:
+        lines = f.readlines()
+        for line in lines:
+            if lines.index(line) == len(lines)-1: #if its the last line
+                correct_for_newline = len(line)
+            else:
+                correct_for_newline = -1
+            if line.startswith('username'):
+                username = line[line.index(' ')+1:correct_for_newline]
+            if line.startswith('password'):
+                password = line[line.index(' ')+1:correct_for_newline]
+    return username, password
+
+
 class States:
     
     def __init__(self, params):
@@ -11,17 +43,18 @@ class States:
         self.use_verify = False
         self.verbose = False
         self.proxies = {}
+        self.client = get_client(self.base_url, self.use_verify, self.proxies)
         
     def get_metadata_injection(self):
         token, expires, message, success = eln.authenticate(self.username, self.password, 
                                                             base_URL=self.base_url,verbose=self.verbose, 
-                                                            use_verify=self.use_verify, proxies=self.proxies)
+                                                            use_verify=self.use_verify, proxies=self.proxies, client=self.client)
         entry_id, entry, status_code = eln.get_last_entry_by_title(token, title=self.params['injection']['eln_entry_id'],
                                                                     base_URL=self.base_url,verbose=self.verbose, 
-                                                                    use_verify=self.use_verify, proxies=self.proxies)
+                                                                    use_verify=self.use_verify, proxies=self.proxies, client=self.client)
         
         data_element_id = entry['elements'][0]['id']
-        data_element = eln.get_data_element(token, element_id=data_element_id, base_URL=self.base_url, verify=self.use_verify, proxies=self.proxies)
+        data_element = eln.get_data_element(token, element_id=data_element_id, base_URL=self.base_url, verify=self.use_verify, proxies=self.proxies, client=self.client)
 
         self.params['injection']['date'] = data_element['data_elements'][0]['children'][0]['description']
         self.params['injection']['experimenter'] = data_element['data_elements'][0]['children'][1]['description']
@@ -37,19 +70,19 @@ class States:
         self.params['injection']['ML'] = data_element['data_elements'][3]['children'][4]['children'][1]['description']
         self.params['injection']['DV'] = data_element['data_elements'][3]['children'][4]['children'][2]['description']
         
-        eln.logout(token, base_URL=self.base_url, use_verify=self.use_verify, proxies=self.proxies)
+        eln.logout(token, base_URL=self.base_url, use_verify=self.use_verify, proxies=self.proxies, client=self.client)
         return self.params
     
     def get_metadata_implantation(self):
         token, expires, message, success = eln.authenticate(self.username, self.password, 
                                                             base_URL=self.base_url,verbose=self.verbose, 
-                                                            use_verify=self.use_verify, proxies=self.proxies)
+                                                            use_verify=self.use_verify, proxies=self.proxies, client=self.client)
         entry_id, entry, status_code = eln.get_last_entry_by_title(token, title=self.params['implantation']['eln_entry_id'],
                                                                     base_URL=self.base_url,verbose=self.verbose, 
-                                                                    use_verify=self.use_verify, proxies=self.proxies)
+                                                                    use_verify=self.use_verify, proxies=self.proxies, client=self.client)
         
         data_element_id = entry['elements'][0]['id']
-        data_element = eln.get_data_element(token, element_id=data_element_id, base_URL=self.base_url, verify=self.use_verify, proxies=self.proxies)        
+        data_element = eln.get_data_element(token, element_id=data_element_id, base_URL=self.base_url, verify=self.use_verify, proxies=self.proxies, client=self.client)        
         
         self.params['implantation']['date'] = data_element['data_elements'][0]['children'][0]['description']
         self.params['implantation']['experimenter'] = data_element['data_elements'][0]['children'][1]['description']
@@ -65,7 +98,7 @@ class States:
         self.params['implantation']['ML'] = data_element['data_elements'][3]['children'][2]['children'][1]['description']
         self.params['implantation']['DV'] = data_element['data_elements'][3]['children'][2]['children'][2]['description']
         
-        eln.logout(token, base_URL=self.base_url, use_verify=self.use_verify, proxies=self.proxies)
+        eln.logout(token, base_URL=self.base_url, use_verify=self.use_verify, proxies=self.proxies, client=self.client)
         return self.params
     
     
\ No newline at end of file
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from eln2nwb import __version__
+from eln2nwb import convert2nwb
+from eln2nwb import instrumentation
+from eln2nwb import sidecar
+
+
+# Inputs that each part of the NWB file is converted from: the movie, the sheets of the AllData workbook (only the
+# columns that are converted, 'CAI - Traces/Times' are the frame timestamps to which all recordings are aligned), and
+# of the thermal table, which is shared by all sessions, the rows of the session ('thermal_rows'). ELN metadata,
+# conversion parameters and converter version ('metadata') affect the whole file.
+STAGE_INPUTS = {'acquisition': ['movie_filepath', 'CAI - Traces/Times'],
+                'ophys': ['movie_filepath', 'CAI - ROIS', 'CAI - Traces'],
+                'behavior': ['Tracking', 'CAI - Traces/Times'],
+                'behavioral_intervals': ['Behaviour', 'CAI - Traces/Times'],
+                'cardiac': ['HeartRate', 'CAI - Traces/Times'],
+                'thermal': ['thermal_rows', 'CAI - Traces/Times']}
+
+# Conversion parameters that only affect how the file is written, but not its contents
+RUNTIME_PARAMS = ['stream_movie', 'movie_buffer_gb', 'cache_dir', 'sidecar_cache']
+
+# Params that describe the session and how it is converted (credentials and open handles are excluded)
+METADATA_KEYS = ['session_description', 'session_id', 'injection', 'implantation', 'storage_policy'] + \
+                [key for key in convert2nwb.DEFAULT_CONVERSION_PARAMS.keys() if key not in RUNTIME_PARAMS]
+
+
+def hash_file(filepath, cache_dir=None, blocksize=2**24):
+    '''
+    Computes the sha256 of a file's contents. The hash is memoized in the sidecar directory of the file
+    and only recomputed when size or modification time of the file change.
+    '''
+    signature = sidecar.get_source_signature(filepath)
+    memo_path = os.path.join(sidecar.get_sidecar_dir(filepath, cache_dir), 'content_hash.json')
+    if os.path.isfile(memo_path):
+        with open(memo_path, 'r') as f:
+            memo = json.load(f)
+        if memo['source'] == signature:
+            return memo['sha256']
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha.update(block)
+    try:
+        os.makedirs(os.path.dirname(memo_path), exist_ok=True)
+        with open(memo_path, 'w') as f:
+            json.dump({'source': signature, 'sha256': sha.hexdigest()}, f)
+    except OSError:
+        pass
+    return sha.hexdigest()
+
+
+def hash_dataframe(df):
+    sha = hashlib.sha256(json.dumps([str(column) for column in df.columns]).encode())
+    sha.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return sha.hexdigest()
+
+
+def read_memo(memo_path, signature):
+    # Hashes that were memoized for the given size and modification time of their source file
+    if os.path.isfile(memo_path):
+        with open(memo_path, 'r') as f:
+            memo = json.load(f)
+        if memo.get('source') == signature:
+            return memo['sha256']
+    return {}
+
+
+def write_memo(memo_path, signature, d_hashes):
+    try:
+        os.makedirs(os.path.dirname(memo_path), exist_ok=True)
+        with open(memo_path, 'w') as f:
+            json.dump({'source': signature, 'sha256': d_hashes}, f)
+    except OSError:
+        pass
+
+
+def hash_sheets(params, alldata_filepath):
+    '''
+    Computes the sha256 of the converted columns of each sheet of the AllData workbook (see convert2nwb.ALLDATA_COLUMNS),
+    and of the frame timestamps ('CAI - Traces/Times'), so that e.g. a corrected 'Behaviour' sheet only invalidates
+    the stages that are converted from it. Memoized like hash_file.
+    :return: dict, maps sheet names to sha256 hex digests
+    '''
+    cache_dir = convert2nwb.get_param(params, 'cache_dir')
+    signature = sidecar.get_source_signature(alldata_filepath)
+    memo_path = os.path.join(sidecar.get_sidecar_dir(alldata_filepath, cache_dir), 'sheet_hashes.json')
+    memo_key = json.dumps(convert2nwb.ALLDATA_COLUMNS, sort_keys=True)
+    d_memo = read_memo(memo_path, signature)
+    if memo_key in d_memo:
+        return d_memo[memo_key]
+    workbook = sidecar.LazyWorkbook(alldata_filepath, sidecar.ALLDATA_SHEETS, columns=convert2nwb.ALLDATA_COLUMNS,
+                                    cache_dir=cache_dir, use_sidecar=convert2nwb.get_param(params, 'sidecar_cache'))
+    d_hashes = {}
+    for sheet_name in sidecar.ALLDATA_SHEETS:
+        d_hashes[sheet_name] = hash_dataframe(workbook[sheet_name])
+        if sheet_name == 'CAI - Traces':
+            d_hashes['CAI - Traces/Times'] = hash_dataframe(workbook.get(sheet_name, columns=['Times']))
+        workbook.release(sheet_name)
+    write_memo(memo_path, signature, dict(d_memo, **{memo_key: d_hashes}))
+    return d_hashes
+
+
+def hash_thermal_rows(params, thermal_filepath, cache_dir=None):
+    '''
+    Computes the sha256 of the rows of the thermal table that are converted for this session (see convert2nwb.read_thermal_rows),
+    so that changes to the recordings of other sessions do not invalidate it. Memoized like hash_file.
+    '''
+    signature = sidecar.get_source_signature(thermal_filepath)
+    d_filters = {'Animal_ID': convert2nwb.get_param(params, 'thermal_animal_id'), 'Session': convert2nwb.get_param(params, 'thermal_session_id')}
+    memo_path = os.path.join(sidecar.get_sidecar_dir(thermal_filepath, cache_dir), 'rows_hash.json')
+    memo_key = json.dumps(d_filters, sort_keys=True, default=str)
+    d_memo = read_memo(memo_path, signature)
+    if memo_key in d_memo:
+        return d_memo[memo_key]
+    sha = hash_dataframe(convert2nwb.read_thermal_rows(params, thermal_filepath))
+    write_memo(memo_path, signature, dict(d_memo, **{memo_key: sha}))
+    return sha
+
+
+def get_fingerprints(params):
+    '''
+    Computes one fingerprint per stage of the conversion (see STAGE_INPUTS) from the contents of its inputs,
+    plus a 'metadata' fingerprint over the ELN metadata, the conversion parameters and the converter version.
+    :return: dict, maps stage names to sha256 hex digests
+    '''
+    d_filepaths = convert2nwb.get_input_filepaths(params)
+    cache_dir = convert2nwb.get_param(params, 'cache_dir')
+    d_input_hashes = {'movie_filepath': hash_file(d_filepaths['movie_filepath'], cache_dir),
+                      'thermal_rows': hash_thermal_rows(params, d_filepaths['thermal_filepath'], cache_dir)}
+    d_input_hashes.update(hash_sheets(params, d_filepaths['alldata_filepath']))
+    metadata = {key: params[key] for key in METADATA_KEYS if key in params}
+    metadata['converter_version'] = __version__
+    d_fingerprints = {'metadata': hashlib.sha256(json.dumps(metadata, sort_keys=True, default=str).encode()).hexdigest()}
+    for stage, l_input_keys in STAGE_INPUTS.items():
+        sha = hashlib.sha256()
+        for key in l_input_keys:
+            sha.update(d_input_hashes[key].encode())
+        d_fingerprints[stage] = sha.hexdigest()
+    return d_fingerprints
+
+
+def get_fingerprint_filepath(nwb_filepath):
+    return nwb_filepath + '.fingerprint.json'
+
+
+def read_fingerprints(nwb_filepath):
+    # NWB-Zarr stores are directories
+    if not os.path.exists(nwb_filepath) or not os.path.isfile(get_fingerprint_filepath(nwb_filepath)):
+        return None
+    with open(get_fingerprint_filepath(nwb_filepath), 'r') as f:
+        return json.load(f)
+
+
+def write_fingerprints(nwb_filepath, d_fingerprints):
+    with open(get_fingerprint_filepath(nwb_filepath), 'w') as f:
+        json.dump(d_fingerprints, f, indent=2)
+
+
+def get_stage_of_path(path):
+    # e.g. '/processing/behavior/Position/SpatialSeries/timestamps' -> 'behavior'
+    l_parts = path.strip('/').split('/')
+    if l_parts[0] in ['processing', 'intervals'] and len(l_parts) > 1:
+        return l_parts[1]
+    elif l_parts[0] == 'acquisition':
+        return 'acquisition'
+    return 'metadata'
+
+
+def add_linking_stages(nwb_filepath, l_changed):
+    # Stages whose data in the existing file links into changed stages (e.g. behavior timestamps that link to
+    # those of the heart rate in cardiac) have to be replaced along with them
+    l_stages = list(l_changed)
+    while True:
+        l_group_paths = [convert2nwb.get_group_path(stage) for stage in l_stages]
+        l_linking = sorted(set(get_stage_of_path(path) for path, target in convert2nwb.get_incoming_links(nwb_filepath, l_group_paths)))
+        if all(stage in l_stages for stage in l_linking):
+            return l_stages
+        l_stages += [stage for stage in l_linking if stage not in l_stages]
+
+
+def get_conversion_plan(d_fingerprints, nwb_filepath):
+    '''
+    Compares the fingerprints of a session with those recorded for its existing NWB file.
+    :return: 'skip' if nothing changed, 'update' if only stages changed that can be replaced in the existing file
+             (convert2nwb.update_nwbfile), or 'full'; and the list of stages to convert
+             (the changed stages, plus, for 'update', the stages that link to them in the existing file)
+    '''
+    d_recorded = read_fingerprints(nwb_filepath)
+    if d_recorded is None:
+        return 'full', list(d_fingerprints.keys())
+    l_changed = [stage for stage, fingerprint in d_fingerprints.items() if d_recorded.get(stage) != fingerprint]
+    if len(l_changed) == 0:
+        return 'skip', l_changed
+    l_updatable = convert2nwb.UPDATABLE_MODULES + convert2nwb.UPDATABLE_INTERVALS
+    if all(stage in l_updatable for stage in l_changed) and not convert2nwb.is_zarr_store(nwb_filepath):
+        l_stages = add_linking_stages(nwb_filepath, l_changed)
+        if all(stage in l_updatable for stage in l_stages):
+            return 'update', l_stages
+    return 'full', l_changed
+
+
+def save_or_update(nwbfile, nwb_filepath, d_fingerprints, plan, l_changed, profiler=None, number_of_jobs=1):
+    # Writes only what the plan requires, records the fingerprints of the written file and returns the executed plan.
+    # Outdated fingerprints are removed first, so that an interrupted write is redone next time.
+    # Modules of NWB-Zarr stores cannot be replaced in place, so these are always rewritten.
+    if plan == 'update' and convert2nwb.is_zarr_store(nwb_filepath):
+        plan = 'full'
+    if plan == 'update':
+        # Only the replaced stages are up to date, the others keep the fingerprints of the data they were written from
+        d_fingerprints = dict(read_fingerprints(nwb_filepath) or {}, **{stage: d_fingerprints[stage] for stage in l_changed})
+    if os.path.isfile(get_fingerprint_filepath(nwb_filepath)):
+        os.remove(get_fingerprint_filepath(nwb_filepath))
+    if profiler is None:
+        profiler = instrumentation.Profiler()
+    with profiler.stage('write'):
+        if plan == 'update':
+            convert2nwb.update_nwbfile(nwbfile, nwb_filepath,
+                                       l_module_names=[stage for stage in l_changed if stage in convert2nwb.UPDATABLE_MODULES],
+                                       l_interval_names=[stage for stage in l_changed if stage in convert2nwb.UPDATABLE_INTERVALS])
+        elif plan == 'full':
+            convert2nwb.save_nwbfile(nwbfile, nwb_filepath, number_of_jobs=number_of_jobs)
+    write_fingerprints(nwb_filepath, d_fingerprints)
+    return plan
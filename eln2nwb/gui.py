@@ -4,9 +4,18 @@ from IPython.display import display
 from eln2nwb import labfolder as eln
 from eln2nwb import eln2widget
 from eln2nwb import convert2nwb
+from eln2nwb import fingerprint
+from eln2nwb import instrumentation
+from eln2nwb import storage
+from eln2nwb import preview
+from eln2nwb import validation
 from nwbwidgets import nwb2widget
-from pynwb import NWBHDF5IO
+import matplotlib.pyplot as plt
+import numpy as np
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 
 INITIAL_PARAMS = {'project_options': ['AG Tovote - States', 'AG Ip - Deep brain stimulation']}
@@ -81,6 +90,11 @@ class Convert_states:
         self.sessions_accordion.children = [States_session(self.sessions_accordion, 0).widget]
         self.sessions_accordion.set_title(0, 'session 1')
         self.vspace = w.Label(value='', layout={'width': '90%', 'height': '20px'})
+        self.select_backend = w.Dropdown(options=[('NWB file (HDF5)', 'hdf5'), ('NWB-Zarr store (parallel writes)', 'zarr')],
+                                         value=storage.DEFAULT_BACKEND,
+                                         description='Output format:',
+                                         style={'description_width': 'initial'},
+                                         layout={'width': '50%', 'visibility': 'hidden'})
         self.button_initialize_conversion = w.Button(description='Initialize conversion', icon='rocket',
                                                     style={'description_width': 'initial', 
                                                            'button_color': 'orange',
@@ -101,6 +115,7 @@ class Convert_states:
                               self.vspace,
                               self.sessions_accordion,
                               self.vspace,
+                              self.select_backend,
                               self.button_initialize_conversion])
         
         self.button_initialize_conversion.on_click(self.on_button_initialize_conversion_clicked)
@@ -134,19 +149,14 @@ class Convert_states:
             print('--> Experimenter: ', self.params['implantation']['experimenter'])
         
         self.sessions_accordion.layout.visibility = 'visible'
+        self.select_backend.layout.visibility = 'visible'
         self.button_initialize_conversion.layout.visibility = 'visible'
         
     def on_button_initialize_conversion_clicked(self, b):
         self.params['file_dir'] = self.sessions_accordion.children[0].children[2].value
         self.params['session_description'] = self.sessions_accordion.children[0].children[0].children[0].value
-        if self.params['session_description'] == 'open field':
-            self.params['session_id'] = 'OF'
-        elif self.params['session_description'] == 'elevated plus maze':
-            self.params['session_id'] = 'EPM'
-        elif self.params['session_description'] == 'conditioning day 1':
-            self.params['session_id'] = 'CD1'
-        elif self.params['session_description'] == 'conditioning day 2':
-            self.params['session_id'] = 'CD2'
+        self.params['session_id'] = convert2nwb.SESSION_IDS[self.params['session_description']]
+        self.params['backend'] = self.select_backend.value
         with self.parent_out:
             print('Conversion initialized! This might take some moments... ')
         self.params['nwbfile'] = convert2nwb.convert_states(self.params)
@@ -156,17 +166,7 @@ class Convert_states:
         self.widget.children = [self.inspect.widget]
             
     def get_login_credentials(self):
-        with open('ELN_login.txt', 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                if lines.index(line) == len(lines)-1: #if its the last line
-                    correct_for_newline = len(line)
-                else:
-                    correct_for_newline = -1
-                if line.startswith('username'):
-                    self.params['username'] = line[line.index(' ')+1:correct_for_newline]
-                if line.startswith('password'):
-                    self.params['password'] = line[line.index(' ')+1:correct_for_newline]
+        self.params['username'], self.params['password'] = eln2widget.read_login_credentials('ELN_login.txt')
                     
 class States_session:
     
@@ -228,32 +228,191 @@ class Inspect:
                                            layout={'width': '75%'})
         self.button_inspect_nwb_file = w.Button(description='Inspect', icon='search')
         self.button_save_nwb_file = w.Button(description='Save', icon='save')
+        self.checkbox_update = w.Checkbox(description='Only update {} and {} of an existing file'.format(', '.join(convert2nwb.UPDATABLE_MODULES),
+                                                                                                   ', '.join(convert2nwb.UPDATABLE_INTERVALS)),
+                                          value=False,
+                                          style={'description_width': 'initial'},
+                                          layout={'width': '90%'})
+        self.checkbox_export = w.Checkbox(description='Also export the NWB-Zarr store into a single NWB (HDF5) file',
+                                          value=False,
+                                          style={'description_width': 'initial'},
+                                          layout={'width': '90%'})
         
         self.vspace = w.Label(value=' ', layout={'heigth': '20px'})
         
+        self.progress = w.FloatProgress(value=0., min=0., max=1., description='Saving:', layout={'width': '50%'})
+        self.progress_label = w.Label(value='')
+        self.button_cancel_save = w.Button(description='Cancel', icon='times')
+        self.profile_table = w.HTML(value='')
+        self.validation_label = w.Label(value='')
+        self.validation_table = w.HTML(value='')
+        self.saving = w.VBox([w.HBox([self.progress, self.button_cancel_save, self.progress_label], layout={'width': '90%'}),
+                              self.profile_table,
+                              self.validation_label,
+                              self.validation_table])
+        # Saved files are validated in worker processes, see start_validation
+        self.validation_executor = None
+        self.cancel_event = threading.Event()
+        # Saved files are inspected by reading them lazily, see button_inspect_nwb_file_clicked
+        self.read_io = None
+        
+        self.controls = w.VBox([w.HBox([self.select_nwb_file, self.button_inspect_nwb_file, self.button_save_nwb_file], layout={'width': '90%'}),
+                                self.checkbox_update])
+        if storage.get_backend(self.params) == 'zarr':
+            self.controls.children = self.controls.children + (self.checkbox_export, )
+        
         self.widget = w.VBox([self.intro, 
                               self.vspace,
-                              w.HBox([self.select_nwb_file, self.button_inspect_nwb_file, self.button_save_nwb_file], layout={'width': '90%'})])
+                              self.controls])
         
         self.button_inspect_nwb_file.on_click(self.button_inspect_nwb_file_clicked)
         self.button_save_nwb_file.on_click(self.button_save_nwb_file_clicked)
+        self.button_cancel_save.on_click(self.button_cancel_save_clicked)
         
     def button_inspect_nwb_file_clicked(self, b):
+        if self.params.get('nwb_filepath') is not None:
+            # Only what is displayed is read from the saved file, so the session does not have to fit into memory
+            if self.read_io is not None:
+                self.read_io.close()
+            self.read_io = convert2nwb.open_nwbfile(self.params['nwb_filepath'])
+            nwbfile = self.read_io.read()
+            l_views = [self.create_movie_preview(nwbfile), self.vspace, nwb2widget(nwbfile)]
+        else:
+            l_views = [nwb2widget(self.params['nwbfile'])]
         self.widget.children = [self.intro,
                                 self.vspace,
-                                w.HBox([self.select_nwb_file, self.button_inspect_nwb_file, self.button_save_nwb_file], layout={'width': '90%'}),
-                                self.vspace,
-                                nwb2widget(self.params['nwbfile'])]
-    def button_save_nwb_file_clicked(self, b):
-        filepath = '{}/{}_{}.nwb'.format(os.getcwd(), self.params['injection']['mouse_id'], self.params['session_id'])
-        with NWBHDF5IO(filepath, 'w') as io:
-            io.write(self.params['nwbfile'])
+                                self.controls,
+                                self.vspace] + l_views
+        
+    def create_movie_preview(self, nwbfile):
+        if 'CaI' not in nwbfile.acquisition:
+            return w.Label(value='The NWB file contains no CaI movie.')
+        frames, frame_indices = preview.get_movie_preview(nwbfile.acquisition['CaI'].data, self.params['nwb_filepath'])
+        vmin, vmax = np.percentile(frames, [1, 99])
+        slider = w.IntSlider(value=0, min=0, max=len(frames) - 1, description='Preview frame:',
+                             style={'description_width': 'initial'}, layout={'width': '50%'})
+        
+        def show_frame(idx):
+            plt.figure(figsize=(6, 6))
+            plt.imshow(frames[idx], cmap='gray', vmin=vmin, vmax=vmax)
+            plt.title('CaI frame {} (downsampled preview)'.format(frame_indices[idx]))
+            plt.axis('off')
+            plt.show()
+        
+        return w.VBox([slider, w.interactive_output(show_frame, {'idx': slider})])
         
+
+    def button_save_nwb_file_clicked(self, b):
+        # The file is written in a background thread, so that the kernel stays responsive
+        self.button_save_nwb_file.disabled = True
+        self.cancel_event.clear()
+        self.progress.value = 0.
+        self.progress.bar_style = ''
+        self.progress_label.value = 'Preparing...'
         self.widget.children = [self.intro,
                                 self.vspace,
-                                w.HBox([self.select_nwb_file, self.button_inspect_nwb_file, self.button_save_nwb_file], layout={'width': '90%'}),
+                                self.controls,
                                 self.vspace,
-                                w.Label(value='Your NWB file was successfully saved!')]
+                                self.saving]
+        threading.Thread(target=self.save_in_background, daemon=True).start()
+        
+    def button_cancel_save_clicked(self, b):
+        self.cancel_event.set()
+        self.progress_label.value = 'Cancelling...'
+        
+    def save_in_background(self):
+        saved = False
+        filepath = convert2nwb.get_output_filepath(self.params, os.getcwd())
+        movie_iterator = convert2nwb.get_movie_iterator(self.params['nwbfile'])
+        try:
+            d_fingerprints = fingerprint.get_fingerprints(self.params)
+            plan, l_changed = fingerprint.get_conversion_plan(d_fingerprints, filepath)
+            if self.checkbox_update.value and os.path.isfile(filepath):
+                # The rest of the existing file has to be up to date, otherwise it would be recorded as such
+                l_outdated = [stage for stage in l_changed if stage not in convert2nwb.UPDATABLE_MODULES + convert2nwb.UPDATABLE_INTERVALS]
+                if plan != 'skip' and len(l_outdated) > 0:
+                    raise ValueError('{} changed since the existing file was written, so it has to be saved as a whole'.format(', '.join(l_outdated)))
+                plan, l_changed = 'update', convert2nwb.UPDATABLE_MODULES + convert2nwb.UPDATABLE_INTERVALS
+            if self.cancel_event.is_set():
+                raise convert2nwb.SaveCancelled()
+            if movie_iterator is not None and plan == 'full':
+                movie_iterator.cancel_event = self.cancel_event
+                movie_iterator.progress_callback = self.create_progress_callback(movie_iterator.nbytes, convert2nwb.get_temporary_filepath(filepath))
+            self.progress_label.value = 'Writing {}...'.format(filepath)
+            plan = fingerprint.save_or_update(self.params['nwbfile'], filepath, d_fingerprints, plan, l_changed, profiler=self.params.get('profiler'))
+            if self.checkbox_export.value and convert2nwb.is_zarr_store(filepath):
+                self.progress_label.value = 'Exporting {} into a single NWB file...'.format(filepath)
+                convert2nwb.export_to_hdf5(filepath)
+            # From now on, the session is inspected from the saved file
+            self.params['nwb_filepath'] = filepath
+            convert2nwb.release_conversion(self.params)
+            saved = True
+            self.start_validation(filepath)
+            if self.params.get('profiler') is not None:
+                self.params['profiler'].save(instrumentation.get_profile_filepath(filepath))
+                self.profile_table.value = self.params['profiler'].to_html()
+            if plan == 'skip':
+                message = 'Your NWB file is already up to date, nothing had to be saved!'
+            elif plan == 'update':
+                message = 'Your existing NWB file was successfully updated ({})!'.format(', '.join(l_changed))
+            else:
+                message = 'Your NWB file was successfully saved!'
+            self.progress.value = 1.
+            self.progress.bar_style = 'success'
+        except convert2nwb.SaveCancelled:
+            message = 'Saving was cancelled, no file was written.'
+            self.progress.bar_style = 'warning'
+        except Exception as e:
+            message = 'Saving failed: {}'.format(e)
+            self.progress.bar_style = 'danger'
+        finally:
+            if movie_iterator is not None:
+                movie_iterator.progress_callback = None
+                movie_iterator.cancel_event = None
+            # The in-memory NWBFile is released once it is saved, so it cannot be saved again
+            self.button_save_nwb_file.disabled = saved
+        self.progress_label.value = message
+        
+    def start_validation(self, filepath):
+        # Findings are shown as soon as each check finishes, while the GUI stays responsive
+        if self.validation_executor is None:
+            self.validation_executor = ProcessPoolExecutor(max_workers=len(validation.VALIDATION_CHECKS))
+        state = {'findings': [], 'n_pending': len(validation.VALIDATION_CHECKS)}
+        self.validation_label.value = 'Validating {}...'.format(filepath)
+        self.validation_table.value = ''
+        
+        def validation_callback(future):
+            state['findings'] += future.result()
+            state['n_pending'] -= 1
+            d_counts = validation.count_findings(state['findings'])
+            self.validation_label.value = '{}: {} errors, {} warnings, {} best practice violations{}'.format(
+                'Validating' if state['n_pending'] > 0 else 'Validation finished', d_counts['error'],
+                d_counts['warning'], d_counts['best practice'], '...' if state['n_pending'] > 0 else '')
+            self.validation_table.value = validation.findings_to_html(state['findings'])
+        
+        for future in validation.submit_validation(self.validation_executor, filepath).values():
+            future.add_done_callback(validation_callback)
+        
+    def create_progress_callback(self, total_bytes, filepath, update_interval=0.5):
+        # Progress is tracked via the movie blocks, which make up nearly all of the file
+        start = time.time()
+        state = {'bytes_written': 0, 'blocks_written': 0, 'last_update': 0.}
+        
+        def progress_callback(nbytes):
+            state['bytes_written'] += nbytes
+            state['blocks_written'] += 1
+            now = time.time()
+            if now - state['last_update'] < update_interval and state['bytes_written'] < total_bytes:
+                return
+            state['last_update'] = now
+            throughput = state['bytes_written'] / max(now - start, 1e-6)
+            eta = (total_bytes - state['bytes_written']) / max(throughput, 1e-6)
+            self.progress.value = min(state['bytes_written'] / max(total_bytes, 1), 1.)
+            self.progress_label.value = '{:.0f} of {:.0f} MB written ({} movie blocks, file size: {:.0f} MB), {:.1f} MB/s, ETA: {:.0f} s'.format(
+                state['bytes_written'] / 1e6, total_bytes / 1e6, state['blocks_written'],
+                os.path.getsize(filepath) / 1e6 if os.path.isfile(filepath) else 0., throughput / 1e6, eta)
+        
+        return progress_callback
         
         
 def launch():
@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then not reported
+    resource = None
+
+
+def read_proc_status(key):
+    # e.g. 'VmRSS' or 'VmHWM' (peak RSS) of this process in bytes, Linux only
+    if not os.path.isfile('/proc/self/status'):
+        return None
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith(key + ':'):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def get_peak_rss():
+    # Peak resident set size of this process in bytes (since the last reset_peak_rss)
+    peak_rss = read_proc_status('VmHWM')
+    if peak_rss is not None or resource is None:
+        return peak_rss
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak_rss
+    return peak_rss * 1024
+
+
+def reset_peak_rss():
+    # Linux (4.0+) can reset the peak RSS to the current RSS. Otherwise the peak is a high-water mark of the whole
+    # process (which is even inherited by processes it starts), so stages only show memory beyond all earlier peaks.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_io_counters():
+    # Bytes read and written by this process (including reads served from the page cache), Linux only
+    if not os.path.isfile('/proc/self/io'):
+        return None
+    d_counters = {}
+    with open('/proc/self/io', 'r') as f:
+        for line in f:
+            key, value = line.split(':')
+            d_counters[key.strip()] = int(value)
+    return d_counters['rchar'], d_counters['wchar']
+
+
+def get_difference(after, before):
+    if after is None or before is None:
+        return None
+    return after - before
+
+
+# Measurements that add up over repeated and nested stages
+ADDITIVE_MEASUREMENTS = ['wall_time_s', 'cpu_time_s', 'bytes_read', 'bytes_written']
+
+
+def max_or_none(a, b):
+    if a is None or b is None:
+        return a if b is None else b
+    return max(a, b)
+
+
+def add_measurements(d_total, d_measurements):
+    for key in ADDITIVE_MEASUREMENTS:
+        d_total[key] = d_total[key] + d_measurements[key] if d_total[key] is not None and d_measurements[key] is not None else None
+
+
+class Profiler:
+    '''
+    Records wall time, CPU time, the peak RSS above the RSS at the start of the stage, and bytes read and written for named stages:
+        with profiler.stage('excel_load'):
+            ...
+    Stages that are entered repeatedly under the same name are reported as one stage with the summed measurements
+    (and the largest increase of the peak RSS). A stage that is entered within another one is not counted for the
+    enclosing stage, e.g. sheets that are loaded on first access while rasterizing the ROIs count for 'excel_load'.
+    Measurements that are not available on the current platform are reported as None.
+    '''
+    def __init__(self):
+        self.l_stages = []
+        # Summed measurements of the stages that were entered within each active stage
+        self.l_nested = []
+        self.peak_rss = None
+
+    @contextmanager
+    def stage(self, name):
+        # The peak RSS of enclosing stages is kept before it is reset for this stage
+        for d_nested in self.l_nested:
+            d_nested['peak_rss'] = max_or_none(d_nested['peak_rss'], get_peak_rss())
+        if reset_peak_rss():
+            rss_start = read_proc_status('VmRSS')
+        else:
+            rss_start = get_peak_rss()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        io_start = get_io_counters()
+        d_nested = {key: 0 for key in ADDITIVE_MEASUREMENTS}
+        d_nested['peak_rss'] = rss_start
+        self.l_nested.append(d_nested)
+        try:
+            yield
+        finally:
+            self.l_nested.pop()
+            io_stop = get_io_counters()
+            d_measurements = {'wall_time_s': time.perf_counter() - wall_start,
+                              'cpu_time_s': time.process_time() - cpu_start,
+                              'bytes_read': get_difference(io_stop[0], io_start[0]) if io_start is not None else None,
+                              'bytes_written': get_difference(io_stop[1], io_start[1]) if io_start is not None else None}
+            peak_rss = max_or_none(d_nested['peak_rss'], get_peak_rss())
+            self.peak_rss = max_or_none(self.peak_rss, peak_rss)
+            if len(self.l_nested) > 0:
+                add_measurements(self.l_nested[-1], d_measurements)
+                self.l_nested[-1]['peak_rss'] = max_or_none(self.l_nested[-1]['peak_rss'], peak_rss)
+            d_stage = {'stage': name, 'peak_rss_delta_bytes': get_difference(peak_rss, rss_start)}
+            d_stage.update({key: d_measurements[key] - d_nested[key] if d_measurements[key] is not None else None
+                            for key in ADDITIVE_MEASUREMENTS})
+            self.add_stage(d_stage)
+
+    def add_stage(self, d_stage):
+        for d_recorded in self.l_stages:
+            if d_recorded['stage'] == d_stage['stage']:
+                add_measurements(d_recorded, d_stage)
+                if d_recorded['peak_rss_delta_bytes'] is not None and d_stage['peak_rss_delta_bytes'] is not None:
+                    d_recorded['peak_rss_delta_bytes'] = max(d_recorded['peak_rss_delta_bytes'], d_stage['peak_rss_delta_bytes'])
+                return
+        self.l_stages.append({key: d_stage[key] for key in ['stage', 'wall_time_s', 'cpu_time_s', 'peak_rss_delta_bytes',
+                                                               'bytes_read', 'bytes_written']})
+
+    def report(self):
+        return {'stages': self.l_stages,
+                'total_wall_time_s': sum(stage['wall_time_s'] for stage in self.l_stages),
+                'peak_rss_bytes': max_or_none(self.peak_rss, get_peak_rss())}
+
+    def save(self, filepath):
+        with open(filepath, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def to_html(self):
+        def format_bytes(nbytes):
+            return '{:.1f} MB'.format(nbytes / 1e6) if nbytes is not None else 'n/a'
+        rows = ''.join('<tr><td>{}</td><td>{:.2f} s</td><td>{:.2f} s</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+                       stage['stage'], stage['wall_time_s'], stage['cpu_time_s'], format_bytes(stage['peak_rss_delta_bytes']),
+                       format_bytes(stage['bytes_read']), format_bytes(stage['bytes_written'])) for stage in self.l_stages)
+        return ('<table><tr><th>Stage</th><th>Wall time</th><th>CPU time</th><th>Peak RSS increase</th>'
+                '<th>Read</th><th>Written</th></tr>{}</table>'.format(rows))
+
+
+def get_profile_filepath(nwb_filepath):
+    return nwb_filepath + '.profile.json'
@@ -1,4 +1,6 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import mimetypes
 import urllib.request
@@ -9,7 +11,52 @@ use_verify = True
 verbose = False
 proxies = {}
 
-def authenticate_v1(labfolder_username, labfolder_password, base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies):
+
+class LabfolderClient:
+    '''
+    Client that owns a requests.Session with a pool of keep-alive connections, so that consecutive calls to the
+    labfolder API reuse their TCP and TLS connections instead of opening new ones. Every function of this module
+    accepts it as optional client parameter:
+        client = LabfolderClient(base_URL='https://labfolder.ukw.de', use_verify=False)
+        token, expires, message, success = authenticate(username, password, base_URL=client.base_URL,
+                                                        use_verify=client.use_verify, proxies=client.proxies, client=client)
+    :param base_URL: string, URL of labfolder server including protocol, defaults to the module default
+    :param use_verify: boolean, whether certificate of https server should be verified, defaults to the module default
+    :param proxies: dict, proxies used for http/https connections, defaults to the module default
+    :param pool_maxsize: int, maximum number of connections that are kept open to the server
+    :param max_retries: int, number of retries of requests that failed to connect or returned 502, 503 or 504
+    '''
+    def __init__(self, base_URL=base_URL, use_verify=use_verify, proxies=proxies, pool_maxsize=10, max_retries=3):
+        self.base_URL = base_URL
+        self.use_verify = use_verify
+        self.proxies = dict(proxies)
+        self.session = requests.Session()
+        self.session.verify = use_verify
+        self.session.proxies.update(self.proxies)
+        # Once the retries are used up, the last response is returned, so callers still see its status code
+        retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=[502, 503, 504], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_session(client=None):
+    # Without client, every request opens a new connection
+    if client is None:
+        return requests
+    return client.session
+
+
+def authenticate_v1(labfolder_username, labfolder_password, base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Note: API v1 is deprecated.
     Function to authenticate against labfolder API v1. It is recommended to use v2 wherever possible.
@@ -20,6 +67,7 @@ def authenticate_v1(labfolder_username, labfolder_password, base_URL=base_URL, v
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     use 'False' only for self-signed certificates.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return:    auth_token, string: labfolder API v1 authentication token
                 message, string:
     '''
@@ -28,7 +76,7 @@ def authenticate_v1(labfolder_username, labfolder_password, base_URL=base_URL, v
         ('email', labfolder_username),
         ('password', labfolder_password),
     ]
-    r = requests.post(API_base_URL + '/login', data=data, verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/login', data=data, verify=use_verify, proxies=proxies)
     response = r.json()
     status = response['status']
     if verbose == True:
@@ -44,7 +92,7 @@ def authenticate_v1(labfolder_username, labfolder_password, base_URL=base_URL, v
     return labfolder_auth_token, message
 
 
-def insert_text_v1(labfolder_auth_token, text_string, entry_id, base_URL=base_URL, verbose=verbose, verify=use_verify, proxies=proxies):
+def insert_text_v1(labfolder_auth_token, text_string, entry_id, base_URL=base_URL, verbose=verbose, verify=use_verify, proxies=proxies, client=None):
     '''
     Note: API v1 is deprecated.
     Function to add a text element to a labfolder entry.
@@ -54,19 +102,20 @@ def insert_text_v1(labfolder_auth_token, text_string, entry_id, base_URL=base_UR
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param verbose: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, response of labfolder API
     '''
     API_base_URL = base_URL + '/api/v1'
     data = {'textContent': text_string}
     headers = {'AuthToken': labfolder_auth_token}
-    r = requests.post(API_base_URL + '/entries/' + str(entry_id) + '/text', headers=headers, data=data, verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/entries/' + str(entry_id) + '/text', headers=headers, data=data, verify=use_verify, proxies=proxies)
     response = r.json()
     if verbose == True:
         print(response)
     return response
 
 
-def insert_file_v1(v1_auth_token, entry_id, filename, base_URL=base_URL, verify=use_verify, proxies=proxies):
+def insert_file_v1(v1_auth_token, entry_id, filename, base_URL=base_URL, verify=use_verify, proxies=proxies, client=None):
     '''
     Note: API v1 is deprecated.
     Function to add a file to a labfolder entry using API v1. It is recommended to use API v2 wherever possible.
@@ -75,6 +124,7 @@ def insert_file_v1(v1_auth_token, entry_id, filename, base_URL=base_URL, verify=
     :param filename: Name of file with full path which should be added to labfolder entry
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, response of labfolder API
     '''
     API_base_URL = base_URL + '/api/v1'
@@ -87,13 +137,13 @@ def insert_file_v1(v1_auth_token, entry_id, filename, base_URL=base_URL, verify=
         'file': (filename, open(filename, 'rb')),
     }
 
-    response = requests.post(API_base_URL + '/entries/' + str(entry_id) + '/file', headers=headers, files=files, verify=use_verify, proxies=proxies)
+    response = get_session(client).post(API_base_URL + '/entries/' + str(entry_id) + '/file', headers=headers, files=files, verify=use_verify, proxies=proxies)
 
     return response
 
 
 def authenticate(labfolder_username, labfolder_password, base_URL=base_URL,
-                 verbose=verbose, use_verify=use_verify, proxies=proxies):
+                 verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Authenticate against labfolder API v2.
     See https://eln.labfolder.com/api/v2/docs/development.html#access-endpoints-post
@@ -103,6 +153,7 @@ def authenticate(labfolder_username, labfolder_password, base_URL=base_URL,
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: string authentification Token, string date of token expiry, string success message
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -114,7 +165,7 @@ def authenticate(labfolder_username, labfolder_password, base_URL=base_URL,
         "user": labfolder_username,
         "password": labfolder_password
     }
-    r = requests.post(API_base_URL + '/auth/login', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/auth/login', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
     success = False
     if verbose == True:
         print(r.json)
@@ -141,7 +192,7 @@ def authenticate(labfolder_username, labfolder_password, base_URL=base_URL,
 
     return labfolder_auth_token, expires, message, success
 
-def logout(labfolder_auth_token, base_URL=base_URL, use_verify=use_verify, proxies=proxies):
+def logout(labfolder_auth_token, base_URL=base_URL, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Invalidate all API access tokens.
     :param labfolder_auth_token: string, labfolder API v2 authentication token
@@ -149,6 +200,7 @@ def logout(labfolder_auth_token, base_URL=base_URL, use_verify=use_verify, proxi
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: int, response http status
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -158,13 +210,13 @@ def logout(labfolder_auth_token, base_URL=base_URL, use_verify=use_verify, proxi
                "Authorization": "Token " + labfolder_auth_token
                }
 
-    r = requests.post(API_base_URL + '/auth/logout', headers=headers,
+    r = get_session(client).post(API_base_URL + '/auth/logout', headers=headers,
                      verify=use_verify, proxies=proxies)
     return r.status_code
 
 def get_all_projects(labfolder_auth_token, group_id='',owner_id='',only_root_level='',folder_id='',
                  project_ids=[],limit=20,offset=0,
-                 verbose=verbose, use_verify=use_verify, proxies=proxies):
+                 verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Returns a list of projects the user has access to. See also https://eln.labfolder.com/api/v2/docs/development.html#projects-projects-resource-get
     :param labfolder_auth_token: string, labfolder API v2 authentication token
@@ -176,6 +228,7 @@ def get_all_projects(labfolder_auth_token, group_id='',owner_id='',only_root_lev
     :param verbose: boolean (optional), Default: False, whether output should be printed.
     :param use_verify: boolean (optional), Default: True, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: server response as json, see also:https://eln.labfolder.com/api/v2/docs/development.html#projects-projects-resource-get
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -200,7 +253,7 @@ def get_all_projects(labfolder_auth_token, group_id='',owner_id='',only_root_lev
     params['limit'] = int(limit)
     params['offset'] = int(offset)
 
-    r = requests.get(API_base_URL+'/projects', headers=headers, params=params, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL+'/projects', headers=headers, params=params, verify=use_verify, proxies=proxies)
     response_json = r.json()
     response_headers = r.headers
     total_projects = int(response_headers['X-Total-Count'])
@@ -209,14 +262,14 @@ def get_all_projects(labfolder_auth_token, group_id='',owner_id='',only_root_lev
         offset+=1
         new_response_json = get_all_projects(labfolder_auth_token, group_id=group_id,owner_id=owner_id,only_root_level=only_root_level,folder_id=folder_id,
                  project_ids=project_ids,limit=limit,offset=offset,
-                 verbose=verbose, use_verify=use_verify, proxies=proxies)
+                 verbose=verbose, use_verify=use_verify, proxies=proxies, client=client)
         for project in new_response_json:
             response_json.append(project)
     return response_json
 
 def get_all_folders(labfolder_auth_token, group_id='',owner_id='',only_root_level='',content_type='',
                     parent_folder_id='',folder_ids='',limit=0,offset=20,
-                    verbose=verbose, use_verify=use_verify, proxies=proxies):
+                    verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Returns a list of folders the user has access to. See also: https://eln.labfolder.com/api/v2/docs/development.html#folders-folders-resource-get
     :param labfolder_auth_token: string, labfolder API v2 authentication token
@@ -231,6 +284,7 @@ def get_all_folders(labfolder_auth_token, group_id='',owner_id='',only_root_leve
     :param verbose: verbose: boolean (optional), Default: False, whether output should be printed.
     :param use_verify: boolean (optional), Default: True, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: server response as json, see also https://eln.labfolder.com/api/v2/docs/development.html#folders-folders-resource-get.
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -255,7 +309,7 @@ def get_all_folders(labfolder_auth_token, group_id='',owner_id='',only_root_leve
         params['folder_ids'] = folder_ids
     params['limit'] = int(limit)
     params['offset'] = int(offset)
-    r = requests.get(API_base_URL+'/folders', headers=headers, params=params, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL+'/folders', headers=headers, params=params, verify=use_verify, proxies=proxies)
     response_json = r.json()
     response_headers = r.headers
     total_projects = int(response_headers['X-Total-Count'])
@@ -266,12 +320,12 @@ def get_all_folders(labfolder_auth_token, group_id='',owner_id='',only_root_leve
                                             only_root_level=only_root_level,
                                             content_type=content_type, parent_folder_id=parent_folder_id,folder_ids=folder_ids,
                                             limit=limit,offset=offset,
-                                            verbose=verbose, use_verify=use_verify, proxies=proxies)
+                                            verbose=verbose, use_verify=use_verify, proxies=proxies, client=client)
         for project in new_response_json:
             response_json.append(project)
     return response_json
 
-def create_folder(labfolder_auth_token, title='New Project',content_type='',group_id='',parent_folder_id='',verbose=verbose, use_verify=use_verify, proxies=proxies):
+def create_folder(labfolder_auth_token, title='New Project',content_type='',group_id='',parent_folder_id='',verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     """
     Create a folder. A folder may either contain projects or templates, as well as children folders of the same type. A private folder is intended for your use only, while a group folder may be shared with the members of that group. See also: https://eln.labfolder.com/api/v2/docs/development.html#folders-folders-resource-post
     :param labfolder_auth_token: string, labfolder API v2 authentication token
@@ -282,6 +336,7 @@ def create_folder(labfolder_auth_token, title='New Project',content_type='',grou
     :param verbose: verbose: boolean (optional), Default: False, whether output should be printed.
     :param use_verify: boolean (optional), Default: True, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: server response as json if successful, see also: https://eln.labfolder.com/api/v2/docs/development.html#folders-folders-resource-post,
              http error code otherwise
     """
@@ -301,7 +356,7 @@ def create_folder(labfolder_auth_token, title='New Project',content_type='',grou
     if parent_folder_id!='':
         params['parent_folder_id'] = str(parent_folder_id)
 
-    r=requests.post(API_base_URL+'/folders', headers=headers, params=params, verify=use_verify, proxies=proxies)
+    r=get_session(client).post(API_base_URL+'/folders', headers=headers, params=params, verify=use_verify, proxies=proxies)
 
     if r.status_code==201:
         return r.json()
@@ -316,7 +371,7 @@ def display_folder_tree(folder_json):
         if folder['parent_folder_id']=="":
             pass
 
-def get_last_entry_by_title(labfolder_auth_token, title, base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies):
+def get_last_entry_by_title(labfolder_auth_token, title, base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Retrieve entry with latest date of modification that where the parameter 'title' is a substring of the entry title
     :param labfolder_auth_token: string, labfolder API v2 authentication token
@@ -325,6 +380,7 @@ def get_last_entry_by_title(labfolder_auth_token, title, base_URL=base_URL, verb
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: entry_id: string, ID of entry which matches search result. Empty string if no entry matches the search criteria or if there is a server error.
              entry: dict, json reprentation of entry.
              status_code: string, HTTP status code of server response.
@@ -343,7 +399,7 @@ def get_last_entry_by_title(labfolder_auth_token, title, base_URL=base_URL, verb
         "limit": '50'
 
     }
-    r = requests.get(API_base_URL + '/entries/?sort=&omit_empty_title=true&title=' + title, headers=headers,
+    r = get_session(client).get(API_base_URL + '/entries/?sort=&omit_empty_title=true&title=' + title, headers=headers,
                      verify=use_verify, proxies=proxies)
     if r.status_code == 200:
         response = r.json()
@@ -366,7 +422,7 @@ def get_last_entry_by_title(labfolder_auth_token, title, base_URL=base_URL, verb
     return entry_id, entry, r.status_code
 
 def get_wellplate(labfolder_auth_token, plate_id, version_id, base_URL=base_URL, verbose=verbose,
-                  use_verify=use_verify, proxies=proxies):
+                  use_verify=use_verify, proxies=proxies, client=None):
     '''
     :param labfolder_auth_token:
     :param plate_id:
@@ -375,6 +431,7 @@ def get_wellplate(labfolder_auth_token, plate_id, version_id, base_URL=base_URL,
     :param verbose:
     :param use_verify:
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return:
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -384,7 +441,7 @@ def get_wellplate(labfolder_auth_token, plate_id, version_id, base_URL=base_URL,
         "Authorization": "Token " + labfolder_auth_token
     }
 
-    r = requests.get(API_base_URL + '/elements/well-plate/' + str(plate_id) + '/version/' + str(version_id),
+    r = get_session(client).get(API_base_URL + '/elements/well-plate/' + str(plate_id) + '/version/' + str(version_id),
                      headers=headers,
                      verify=use_verify, proxies=proxies)
     response = r.json()
@@ -394,7 +451,7 @@ def get_wellplate(labfolder_auth_token, plate_id, version_id, base_URL=base_URL,
 
 
 def get_all_wellplates(labfolder_auth_token, entry_dict={}, base_URL=base_URL, offset=0, omit='', title='', sort='',
-                       verbose=verbose, use_verify=use_verify, proxies=proxies):
+                       verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     :param labfolder_auth_token:
     :param entry_dict:
@@ -406,6 +463,7 @@ def get_all_wellplates(labfolder_auth_token, entry_dict={}, base_URL=base_URL, o
     :param verbose:
     :param use_verify:
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return:
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -417,7 +475,7 @@ def get_all_wellplates(labfolder_auth_token, entry_dict={}, base_URL=base_URL, o
                "Authorization": "Token " + labfolder_auth_token
                }
 
-    r = requests.get(
+    r = get_session(client).get(
         API_base_URL + '/entries?sort=' + sort + '&omit_empty_title=' + omit + '&expand=author,project&limit=&offset=' + str(
             offset), headers=headers,
         verify=use_verify, proxies=proxies)
@@ -432,7 +490,7 @@ def get_all_wellplates(labfolder_auth_token, entry_dict={}, base_URL=base_URL, o
                 plate_id = element['id']
                 version_id = element['version_id']
                 wellplate = get_wellplate(labfolder_auth_token, plate_id, version_id, base_URL=base_URL,
-                                          verbose=verbose, use_verify=use_verify, proxies=proxies)
+                                          verbose=verbose, use_verify=use_verify, proxies=proxies, client=client)
                 try:
                     wellplate_size = wellplate['meta_data']['plate']['size']
                     if wellplate_size == '96':
@@ -460,7 +518,7 @@ def get_all_wellplates(labfolder_auth_token, entry_dict={}, base_URL=base_URL, o
 
     if len(response) > 0:
         out = get_all_wellplates(labfolder_auth_token, entry_dict=new_entry_dict, base_URL=base_URL, offset=offset + 20,
-                           omit='', title='', sort='', verbose=verbose, use_verify=use_verify, proxies=proxies)
+                           omit='', title='', sort='', verbose=verbose, use_verify=use_verify, proxies=proxies, client=client)
 
     if verbose == True:
         print(len(entry_dict), entry_dict)
@@ -622,7 +680,7 @@ def wellplate2TecanPL(wellplate_json):
 
 def create_entry(labfolder_auth_token, project_ID, entry_title='', custom_dates=[], tags=[],
                  base_URL=base_URL,
-                 verbose=verbose, use_verify=use_verify, proxies=proxies):
+                 verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Create entry in project with specified project ID.
     See https://eln.labfolder.com/api/v2/docs/development.html#notebook-entries-post for details.
@@ -635,6 +693,7 @@ def create_entry(labfolder_auth_token, project_ID, entry_title='', custom_dates=
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: response: dict, response of labfolder API
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -658,7 +717,7 @@ def create_entry(labfolder_auth_token, project_ID, entry_title='', custom_dates=
     }
     data = dict(zip(key_list, value_list))
 
-    r = requests.post(API_base_URL + '/entries', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/entries', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
     status_code = r.status_code
     if status_code == 201:
         response = r.json()
@@ -677,7 +736,7 @@ def create_entry(labfolder_auth_token, project_ID, entry_title='', custom_dates=
 def create_single_DE(labfolder_auth_token, labfolder_entry_id,
                      title, value, unit,
                      base_URL=base_URL,
-                     verbose=verbose, use_verify=use_verify, proxies=proxies):
+                     verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Insert Numerical Data Element (Single Data ELement) to labfolder entry specified by entry ID
     For details, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-post
@@ -691,6 +750,7 @@ def create_single_DE(labfolder_auth_token, labfolder_entry_id,
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: status_code: int, HTTP status reponse of labfolder server, message: string, response of labfolder server
     '''
 
@@ -711,7 +771,7 @@ def create_single_DE(labfolder_auth_token, labfolder_entry_id,
             }
         ]
     }
-    r = requests.post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
     if r.status_code == 201:
         message = 'Data Element added'
         if verbose == True:
@@ -727,7 +787,7 @@ def create_single_DE(labfolder_auth_token, labfolder_entry_id,
 def create_descriptive_DE(labfolder_auth_token, entry_id,
                           title, value,
                           base_URL=base_URL,
-                          verbose=verbose, use_verify=use_verify, proxies=proxies):
+                          verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Insert Descriptive Data Element to labfolder entry specified by entry ID
     For details, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-post
@@ -739,6 +799,7 @@ def create_descriptive_DE(labfolder_auth_token, entry_id,
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: status_code: int, HTTP status reponse of labfolder server, message: string, response of labfolder server
     '''
 
@@ -759,7 +820,7 @@ def create_descriptive_DE(labfolder_auth_token, entry_id,
             }
         ]
     }
-    r = requests.post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
     if r.status_code == 201:
         message = 'Data Element added'
         if verbose == True:
@@ -773,7 +834,7 @@ def create_descriptive_DE(labfolder_auth_token, entry_id,
 
 
 def create_Material_DE(labfolder_auth_token, entry_id, item_id,
-                       base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies):
+                       base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     """
     Insert Material Data Element to labfolder entry specified by entry ID
     For details, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-post
@@ -784,6 +845,7 @@ def create_Material_DE(labfolder_auth_token, entry_id, item_id,
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: status_code: int, HTTP status reponse of labfolder server, message: string, response of labfolder server
     """
 
@@ -803,7 +865,7 @@ def create_Material_DE(labfolder_auth_token, entry_id, item_id,
             }
         ]
     }
-    r = requests.post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
     if r.status_code == 201:
         message = 'Data Element added'
         if verbose == True:
@@ -817,7 +879,7 @@ def create_Material_DE(labfolder_auth_token, entry_id, item_id,
 
 
 def create_DE_group(labfolder_auth_token, entry_id, data_elements,
-                    base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies):
+                    base_URL=base_URL, verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     """
     Insert Material Data Element Group to labfolder entry specified by entry ID
     For details, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-post
@@ -828,6 +890,7 @@ def create_DE_group(labfolder_auth_token, entry_id, data_elements,
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: status_code: int, HTTP status reponse of labfolder server, message: string, response of labfolder server
     """
 
@@ -842,7 +905,7 @@ def create_DE_group(labfolder_auth_token, entry_id, data_elements,
         "entry_id": str(entry_id),
         "data_elements":  data_elements
     }
-    r = requests.post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/elements/data', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
     if r.status_code == 201:
         message = 'Data Element added'
         if verbose == True:
@@ -855,7 +918,7 @@ def create_DE_group(labfolder_auth_token, entry_id, data_elements,
     return r.status_code, message
 
 def create_text_element(labfolder_auth_token, text, entry_id, base_URL=base_URL,
-                        verbose=verbose, use_verify=use_verify, proxies=proxies):
+                        verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Create a new text element for the provided notebook entry. The text element content may be plain text or basic HTML. Note: Images should be included in the entry as file elements.
     For details, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-text-elements-post
@@ -866,6 +929,7 @@ def create_text_element(labfolder_auth_token, text, entry_id, base_URL=base_URL,
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -879,14 +943,14 @@ def create_text_element(labfolder_auth_token, text, entry_id, base_URL=base_URL,
         "entry_id": str(entry_id),
         "content": str(text)
     }
-    r = requests.post(API_base_URL + '/elements/text', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/elements/text', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
 
     return r.json()
 
 
 def create_file_element(labfolder_auth_token, filename, entry_id,
                         base_URL=base_URL,
-                        verbose=verbose, use_verify=use_verify, proxies=proxies):
+                        verbose=verbose, use_verify=use_verify, proxies=proxies, client=None):
     """
     Insert File Element to labfolder entry specified by entry ID
     For details, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-file-elements-post
@@ -898,6 +962,7 @@ def create_file_element(labfolder_auth_token, filename, entry_id,
     :param verbose: boolean, whether output should be printed
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: status_code: int, HTTP status reponse of labfolder server, message: string, response of labfolder server
     """
 
@@ -923,7 +988,7 @@ def create_file_element(labfolder_auth_token, filename, entry_id,
     p_uploadfilename = pre_uploadfilename.replace('#', '')
     uploadfilename = p_uploadfilename.replace('-','')
 
-    r = requests.post(API_base_URL + '/elements/file?entry_id=' + str(entry_id) + '&file_name=' + p_uploadfilename,
+    r = get_session(client).post(API_base_URL + '/elements/file?entry_id=' + str(entry_id) + '&file_name=' + p_uploadfilename,
                       headers=headers, data=data, verify=use_verify, proxies=proxies)
 
     status_code = r.status_code
@@ -945,7 +1010,7 @@ def create_file_element(labfolder_auth_token, filename, entry_id,
 
 def get_table(labfolder_auth_token, table_id,
               base_URL=base_URL,
-              use_verify=use_verify, proxies=proxies):
+              use_verify=use_verify, proxies=proxies, client=None):
     '''
     fetch a labfolder table by table ID and return the table JSON
     For details, see: https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-table-elements-get
@@ -956,6 +1021,7 @@ def get_table(labfolder_auth_token, table_id,
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, response of labfolder server including JSON of labfolder table or error message
     '''
 
@@ -967,14 +1033,14 @@ def get_table(labfolder_auth_token, table_id,
         "Authorization": "Token " + labfolder_auth_token
     }
 
-    r = requests.get(API_base_URL + '/elements/table/' + str(table_id), headers=headers, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL + '/elements/table/' + str(table_id), headers=headers, verify=use_verify, proxies=proxies)
 
     return (r.json())
 
 
 def get_table_file(labfolder_auth_token, table_id, table_json_file_name='',
                    base_URL='https://eln.labfolder.com/', verbose=verbose,
-                   use_verify=use_verify, proxies=proxies):
+                   use_verify=use_verify, proxies=proxies, client=None):
     '''
     fetch a labfolder table by table ID and store the table JSON as a file
     For details, see: https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-table-elements-get
@@ -986,6 +1052,7 @@ def get_table_file(labfolder_auth_token, table_id, table_json_file_name='',
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, response of labfolder server including JSON of labfolder table or error message
     '''
 
@@ -997,7 +1064,7 @@ def get_table_file(labfolder_auth_token, table_id, table_json_file_name='',
         "Authorization": "Token " + labfolder_auth_token
     }
 
-    r = requests.get(API_base_URL + '/elements/table/' + str(table_id), headers=headers, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL + '/elements/table/' + str(table_id), headers=headers, verify=use_verify, proxies=proxies)
     response = r.json()
 
     if table_json_file_name == '':
@@ -1011,7 +1078,7 @@ def get_table_file(labfolder_auth_token, table_id, table_json_file_name='',
 
 def create_table(labfolder_auth_token, entry_id, table_title, table_json,
                  base_URL='https://eln.labfolder.com/',
-                 use_verify=use_verify, proxies=proxies):
+                 use_verify=use_verify, proxies=proxies, client=None):
     '''
     Append labfolder Table Element to entry with given entry ID based on the input of the JSON of the table.
     For details, see: https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-table-elements-post
@@ -1023,6 +1090,7 @@ def create_table(labfolder_auth_token, entry_id, table_title, table_json,
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-table-elements-post for details
     '''
 
@@ -1040,13 +1108,13 @@ def create_table(labfolder_auth_token, entry_id, table_title, table_json,
         "content": table_json
     }
 
-    r = requests.get(API_base_URL + '/elements/table', headers=headers, data=data, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL + '/elements/table', headers=headers, data=data, verify=use_verify, proxies=proxies)
 
     return r.json()
 
 
 def create_table_json_file(labfolder_auth_token, entry_id, table_title, json_filename,
-                           base_URL=base_URL, use_verify=use_verify, proxies=proxies):
+                           base_URL=base_URL, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Append labfolder Table Element to entry with given entry ID based on the input of the JSON file of the table.
     For details, see: https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-table-elements-post
@@ -1058,6 +1126,7 @@ def create_table_json_file(labfolder_auth_token, entry_id, table_title, json_fil
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain.
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-table-elements-post for details
 
     '''
@@ -1077,7 +1146,7 @@ def create_table_json_file(labfolder_auth_token, entry_id, table_title, json_fil
         "content": table_json
     }
 
-    r = requests.post(API_base_URL + '/elements/table', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/elements/table', headers=headers, data=json.dumps(data), verify=use_verify, proxies=proxies)
 
     return r.json()
 
@@ -1260,7 +1329,7 @@ def array2labfolder_table(inputarray, table_json_filename, table_name='Sheet1'):
 
     return json_dict
 
-def get_apps(labfolder_auth_token, app_id = '', group_id = '', limit=20, base_URL=base_URL, use_verify=use_verify, proxies=proxies):
+def get_apps(labfolder_auth_token, app_id = '', group_id = '', limit=20, base_URL=base_URL, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Returns a list of the group app installations for any groups the requesting user is a member of. The list is ordered by creation date descending.
     :param labfolder_auth_token: string, labfolder API v2 authentication token.
@@ -1270,6 +1339,7 @@ def get_apps(labfolder_auth_token, app_id = '', group_id = '', limit=20, base_UR
     :param base_URL: optional, string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: optional, boolean, whether certificate of https server should be verified against certifi keychain, defaults to True
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#apps-app-installations-get
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -1288,12 +1358,12 @@ def get_apps(labfolder_auth_token, app_id = '', group_id = '', limit=20, base_UR
     if limit != 20:
         params['limit'] = str(limit)
 
-    r = requests.get(API_base_URL + '/app-installations/group?app_id=15', headers=headers, params=params, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL + '/app-installations/group?app_id=15', headers=headers, params=params, verify=use_verify, proxies=proxies)
     response = r.json()
     return response
 
 
-def check_app_installation(labfolder_auth_token, app_id, base_URL=base_URL, use_verify=use_verify, proxies=proxies):
+def check_app_installation(labfolder_auth_token, app_id, base_URL=base_URL, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Returns True if an App with a designated ID is installed for the authenticating user, False otherwise
     :param labfolder_auth_token: string, labfolder API v2 authentication token.
@@ -1301,6 +1371,7 @@ def check_app_installation(labfolder_auth_token, app_id, base_URL=base_URL, use_
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain, defaults to True
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: boolean, True if app with ID specified in parameter app_id is installed for authenticating user, False otherwise
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -1314,7 +1385,7 @@ def check_app_installation(labfolder_auth_token, app_id, base_URL=base_URL, use_
         "app_id":str(app_id)
     }
 
-    r = requests.get(API_base_URL + '/app-installations/group', headers=headers, params=params, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL + '/app-installations/group', headers=headers, params=params, verify=use_verify, proxies=proxies)
 
     response = r.json()
     if response == []:
@@ -1323,7 +1394,7 @@ def check_app_installation(labfolder_auth_token, app_id, base_URL=base_URL, use_
         return True
 
 
-def get_xhtml_exports(labfolder_auth_token, status='', limit='', offset=20, base_URL=base_URL, use_verify=use_verify, proxies=proxies):
+def get_xhtml_exports(labfolder_auth_token, status='', limit='', offset=20, base_URL=base_URL, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Get all created XHTML Exports the requesting user has created.
     :param labfolder_auth_token: labfolder_auth_token: string, labfolder API v2 authentication token.
@@ -1333,6 +1404,7 @@ def get_xhtml_exports(labfolder_auth_token, status='', limit='', offset=20, base
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: boolean, whether certificate of https server should be verified against certifi keychain, defaults to True
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#export-xhtml-exports-post
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -1351,11 +1423,11 @@ def get_xhtml_exports(labfolder_auth_token, status='', limit='', offset=20, base
     if offset != 20:
         params['offset'] = str(offset)
 
-    r = requests.get(API_base_URL + '/exports/xhtml', headers=headers, params=params, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL + '/exports/xhtml', headers=headers, params=params, verify=use_verify, proxies=proxies)
 
     return r.json()
 
-def get_xhtml_export(labfolder_auth_token, export_id, base_URL=base_URL, use_verify=use_verify, proxies=proxies):
+def get_xhtml_export(labfolder_auth_token, export_id, base_URL=base_URL, use_verify=use_verify, proxies=proxies, client=None):
     '''
     Returns the current version of the XHTML export.
     :param labfolder_auth_token: string, labfolder API v2 authentication token.
@@ -1363,6 +1435,7 @@ def get_xhtml_export(labfolder_auth_token, export_id, base_URL=base_URL, use_ver
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#export-xhtml-exports-get-1
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -1371,17 +1444,18 @@ def get_xhtml_export(labfolder_auth_token, export_id, base_URL=base_URL, use_ver
                "Authorization": "Token " + labfolder_auth_token
                }
 
-    r = requests.get(API_base_URL + '/exports/xhtml/'+str(export_id), headers=headers, verify=use_verify, proxies=proxies)
+    r = get_session(client).get(API_base_URL + '/exports/xhtml/'+str(export_id), headers=headers, verify=use_verify, proxies=proxies)
 
     return r.json()
 
 
-def create_xhtml_export(labfolder_auth_token, base_URL=base_URL, verify=use_verify, proxies=proxies):
+def create_xhtml_export(labfolder_auth_token, base_URL=base_URL, verify=use_verify, proxies=proxies, client=None):
     '''
     Create a XHTML export of all content (Projects with their Entries & Templates) the requesting user owns.
     :param labfolder_auth_token: string, labfolder API v2 authentication token.
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#export-xhtml-exports-post
     '''
     API_base_URL = base_URL + '/api/v2'
@@ -1390,11 +1464,11 @@ def create_xhtml_export(labfolder_auth_token, base_URL=base_URL, verify=use_veri
                "Authorization": "Token " + labfolder_auth_token
                }
 
-    r = requests.post(API_base_URL + '/exports/xhtml', headers=headers, verify=use_verify, proxies=proxies)
+    r = get_session(client).post(API_base_URL + '/exports/xhtml', headers=headers, verify=use_verify, proxies=proxies)
 
     return r.json()
 
-def download_xhtml_export(labfolder_auth_token, export_id, export_filename, base_URL=base_URL, verify=use_verify, proxies=proxies):
+def download_xhtml_export(labfolder_auth_token, export_id, export_filename, base_URL=base_URL, verify=use_verify, proxies=proxies, client=None):
     '''
     Download the result file of a finished XHTML export.
     :param labfolder_auth_token: string, labfolder API v2 authentication token.
@@ -1403,22 +1477,23 @@ def download_xhtml_export(labfolder_auth_token, export_id, export_filename, base
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param use_verify: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: string, "Success" if download was successful, one of ["NEW", "RUNNING", "REMOVED", "ERROR", "QUEUED"] if not. See https://eln.labfolder.com/api/v2/docs/development.html#export-xhtml-exports-get for details.
     '''
 
-    api_response = get_xhtml_export(labfolder_auth_token, export_id, base_URL=base_URL, use_verify=use_verify, proxies=proxies)
+    api_response = get_xhtml_export(labfolder_auth_token, export_id, base_URL=base_URL, use_verify=use_verify, proxies=proxies, client=client)
 
     file_status = api_response["status"]
 
     if file_status == 'FINISHED':
         download_url = api_response['download_href']
-        r = requests.get(download_url, allow_redirects=True)
+        r = get_session(client).get(download_url, allow_redirects=True)
         open(export_filename+'.zip', 'wb').write(r.content)
         return "Success"
     else:
         return file_status
 
-def get_data_element(labfolder_auth_token, element_id, base_URL=base_URL, verify=use_verify, proxies=proxies):
+def get_data_element(labfolder_auth_token, element_id, base_URL=base_URL, verify=use_verify, proxies=proxies, client=None):
     """
     Get a data element by id, see also: https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-get
     :param labfolder_auth_token: string, labfolder API v2 authentication token.
@@ -1426,6 +1501,7 @@ def get_data_element(labfolder_auth_token, element_id, base_URL=base_URL, verify
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param verify: bool, whether to verify ssl certificate of server, defaults to true
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-get
     """
     API_base_URL = base_URL + '/api/v2'
@@ -1434,12 +1510,12 @@ def get_data_element(labfolder_auth_token, element_id, base_URL=base_URL, verify
                "Authorization": "Token " + labfolder_auth_token
                }
 
-    r = requests.get(API_base_URL + '/elements/data/' + str(element_id), headers=headers, verify=verify,
+    r = get_session(client).get(API_base_URL + '/elements/data/' + str(element_id), headers=headers, verify=verify,
                      proxies=proxies)
 
     return r.json()
 
-def update_data_element(labfolder_auth_token, entry_id, element_id, new_data_element, base_URL=base_URL, verify=use_verify, proxies=proxies):
+def update_data_element(labfolder_auth_token, entry_id, element_id, new_data_element, base_URL=base_URL, verify=use_verify, proxies=proxies, client=None):
     """
     Get a data element in entry by id, see also: https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-put
     :param labfolder_auth_token: labfolder_auth_token: string, labfolder API v2 authentication token
@@ -1449,6 +1525,7 @@ def update_data_element(labfolder_auth_token, entry_id, element_id, new_data_ele
     :param base_URL: string, URL of labfolder server including protocol, defaults to 'https://eln.labfolder.com'
     :param verify: bool, whether to verify ssl certificate of server, defaults to true
     :param proxies: dict, proxies used for http/https connections, defaults to no proxy (empty dict). See also: https://2.python-requests.org/en/v1.1.0/user/advanced/#proxies
+    :param client: LabfolderClient, whose pooled connections are used, defaults to a new connection per request
     :return: dict, labfolder server reponse in JSON, see https://eln.labfolder.com/api/v2/docs/development.html#entry-elements-data-elements-get
     """
     API_base_URL = base_URL + '/api/v2'
@@ -1463,12 +1540,12 @@ def update_data_element(labfolder_auth_token, entry_id, element_id, new_data_ele
         "data_elements": new_data_element
     }
 
-    r = requests.put(API_base_URL + '/elements/data/' + str(element_id), headers=headers, data=json.dumps(data), verify=use_verify,
+    r = get_session(client).put(API_base_URL + '/elements/data/' + str(element_id), headers=headers, data=json.dumps(data), verify=use_verify,
                      proxies=proxies)
 
     return r.json()
 
-def get_labregister_category(labfolder_auth_token, category_id, base_URL=base_URL, verify=use_verify, proxies=proxies):
+def get_labregister_category(labfolder_auth_token, category_id, base_URL=base_URL, verify=use_verify, proxies=proxies, client=None):
     
     API_base_URL = base_URL + '/api/v2'
     headers = {"Content-Type": "application/json",
@@ -1476,12 +1553,12 @@ def get_labregister_category(labfolder_auth_token, category_id, base_URL=base_UR
                "Authorization": "Token " + labfolder_auth_token
                }
 
-    r = requests.get(API_base_URL + '/mdb/categories/' + str(category_id)+'?expand=creator', headers=headers, verify=use_verify,
+    r = get_session(client).get(API_base_URL + '/mdb/categories/' + str(category_id)+'?expand=creator', headers=headers, verify=use_verify,
                      proxies=proxies)
 
     return r.json()
 
-def get_labregister_item(labfolder_auth_token, item_id, base_URL=base_URL, verify=use_verify, proxies=proxies):
+def get_labregister_item(labfolder_auth_token, item_id, base_URL=base_URL, verify=use_verify, proxies=proxies, client=None):
     
     API_base_URL = base_URL + '/api/v2'
     headers = {"Content-Type": "application/json",
@@ -1489,7 +1566,7 @@ def get_labregister_item(labfolder_auth_token, item_id, base_URL=base_URL, verif
                "Authorization": "Token " + labfolder_auth_token
                }
 
-    r = requests.get(API_base_URL + '/mdb/items/' + str(item_id)+'?expand=category', headers=headers, verify=use_verify,
+    r = get_session(client).get(API_base_URL + '/mdb/items/' + str(item_id)+'?expand=category', headers=headers, verify=use_verify,
                      proxies=proxies)
 
     return r.json()
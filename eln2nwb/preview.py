@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+
+from eln2nwb import sidecar
+
+
+def get_preview_filepath(nwb_filepath):
+    return nwb_filepath.rstrip('/') + '.preview.npz'
+
+
+def compute_movie_preview(dataset, max_frames=300, spatial_factor=4):
+    '''
+    Reads evenly spaced frames of a movie one by one and bins them spatially, so that only the preview is held in memory.
+    :param dataset: h5py.Dataset or zarr.Array, movie with the shape frames x height x width
+    :param max_frames: int, maximum number of frames of the preview
+    :param spatial_factor: int, number of pixels along each axis that are averaged into one preview pixel
+    :return: float32 array with the preview frames, and the indices of these frames in the movie
+    '''
+    frame_indices = np.unique(np.linspace(0, dataset.shape[0] - 1, min(max_frames, dataset.shape[0])).astype(int))
+    height, width = dataset.shape[1] // spatial_factor, dataset.shape[2] // spatial_factor
+    preview = np.empty((len(frame_indices), height, width), dtype=np.float32)
+    for idx, frame_idx in enumerate(frame_indices):
+        frame = np.asarray(dataset[frame_idx], dtype=np.float32)[:height * spatial_factor, :width * spatial_factor]
+        preview[idx] = frame.reshape(height, spatial_factor, width, spatial_factor).mean(axis=(1, 3))
+    return preview, frame_indices
+
+
+def get_movie_preview(dataset, nwb_filepath, max_frames=300, spatial_factor=4):
+    '''
+    Returns the preview of the movie of a saved NWB file (see compute_movie_preview), which is cached next to the file
+    and recomputed when size or modification time of the file change.
+    '''
+    preview_filepath = get_preview_filepath(nwb_filepath)
+    signature = sidecar.get_source_signature(nwb_filepath)
+    settings = np.array([signature['size'], signature['mtime_ns'], max_frames, spatial_factor])
+    if os.path.isfile(preview_filepath):
+        with np.load(preview_filepath) as cached:
+            if np.array_equal(cached['settings'], settings):
+                return cached['preview'], cached['frame_indices']
+    preview, frame_indices = compute_movie_preview(dataset, max_frames, spatial_factor)
+    np.savez(preview_filepath, preview=preview, frame_indices=frame_indices, settings=settings)
+    return preview, frame_indices
@@ -0,0 +1,114 @@
+import hashlib
+import os
+
+import numpy as np
+
+from skimage.draw import polygon
+
+
+# Frame shape of the motion corrected calcium imaging movie
+FRAME_SHAPE = (348, 385)
+
+# Rasterized ROIs of previously converted sessions, keyed by the hash of the 'CAI - ROIS' sheet
+_ROI_CACHE = {}
+
+
+class RoiMasks:
+    '''
+    Sparse masks of all ROIs of one session, stored as packed pixel coordinates:
+    the pixels of ROI i are pixels_x[offsets[i]:offsets[i+1]], pixels_y[offsets[i]:offsets[i+1]].
+    '''
+    def __init__(self, roi_ids, pixels_x, pixels_y, offsets, shape=FRAME_SHAPE):
+        self.roi_ids = list(roi_ids)
+        self.pixels_x = pixels_x
+        self.pixels_y = pixels_y
+        self.offsets = offsets
+        self.shape = tuple(shape)
+
+    def __len__(self):
+        return len(self.roi_ids)
+
+    def pixel_mask(self, idx):
+        start, stop = self.offsets[idx], self.offsets[idx+1]
+        xx, yy = self.pixels_x[start:stop], self.pixels_y[start:stop]
+        return list(zip(xx.tolist(), yy.tolist(), [1.0] * len(xx)))
+
+    def image_mask(self, idx):
+        return pixel_mask_to_image_mask(self.pixel_mask(idx), self.shape)
+
+    def label_image(self):
+        # ROI i is labeled with i+1, 0 is background. Where ROIs overlap, the later ROI wins.
+        label_image = np.zeros(self.shape, dtype=np.int32)
+        labels = np.repeat(np.arange(1, len(self.roi_ids)+1, dtype=np.int32), np.diff(self.offsets))
+        label_image[self.pixels_x, self.pixels_y] = labels
+        return label_image
+
+
+def pixel_mask_to_image_mask(pixel_mask, shape=FRAME_SHAPE):
+    # Dense masks are only built on demand, e.g. for plotting
+    image_mask = np.zeros(shape)
+    if len(pixel_mask) > 0:
+        xx, yy, weights = np.asarray(pixel_mask).T
+        image_mask[xx.astype(int), yy.astype(int)] = weights
+    return image_mask
+
+
+def parse_roi_sheet(df_rois):
+    '''
+    Parses the 'CAI - ROIS' sheet (alternating <ROI>_X and <ROI>_Y columns, padded with NaNs)
+    at once into packed contour coordinates.
+    :return: list of ROI IDs, packed x- and y-coordinates, and the offsets of each ROI's contour
+    '''
+    roi_ids = [elem[:-2] for elem in df_rois.columns[::2]]
+    values = df_rois.to_numpy(dtype=float)
+    x, y = values[:, 0::2].T, values[:, 1::2].T
+    # Each contour ends at its last non-NaN x-coordinate
+    valid = ~np.isnan(x)
+    n_vertices = np.where(valid.any(axis=1), x.shape[1] - np.argmax(valid[:, ::-1], axis=1), 0)
+    in_contour = np.arange(x.shape[1])[np.newaxis, :] < n_vertices[:, np.newaxis]
+    offsets = np.concatenate([[0], np.cumsum(n_vertices)])
+    return roi_ids, x[in_contour], y[in_contour], offsets
+
+
+def hash_roi_sheet(df_rois):
+    sha = hashlib.sha1()
+    sha.update('|'.join(str(column) for column in df_rois.columns).encode())
+    sha.update(np.ascontiguousarray(df_rois.to_numpy(dtype=float)).tobytes())
+    return sha.hexdigest()
+
+
+def rasterize_roi_sheet(df_rois, shape=FRAME_SHAPE, cache_dir=None):
+    '''
+    Rasterizes all ROIs of the 'CAI - ROIS' sheet into sparse masks. Results are cached in memory
+    and, if cache_dir is given, on disk, keyed by a hash of the sheet contents.
+    :param df_rois: pandas.DataFrame, the 'CAI - ROIS' sheet
+    :param shape: tuple, shape of the imaging frame
+    :param cache_dir: string, directory for the on-disk cache, defaults to no on-disk cache
+    :return: RoiMasks
+    '''
+    key = '{}_{}x{}'.format(hash_roi_sheet(df_rois), shape[0], shape[1])
+    if key in _ROI_CACHE:
+        return _ROI_CACHE[key]
+    cache_file = os.path.join(cache_dir, 'rois_{}.npz'.format(key)) if cache_dir is not None else None
+    if cache_file is not None and os.path.isfile(cache_file):
+        with np.load(cache_file) as cached:
+            roi_masks = RoiMasks(cached['roi_ids'].tolist(), cached['pixels_x'], cached['pixels_y'], cached['offsets'], shape)
+    else:
+        roi_ids, contours_x, contours_y, contour_offsets = parse_roi_sheet(df_rois)
+        l_xx, l_yy = [], []
+        for idx in range(len(roi_ids)):
+            start, stop = contour_offsets[idx], contour_offsets[idx+1]
+            xx, yy = polygon(contours_x[start:stop], contours_y[start:stop], shape)
+            l_xx.append(xx)
+            l_yy.append(yy)
+        offsets = np.concatenate([[0], np.cumsum([len(xx) for xx in l_xx])])
+        roi_masks = RoiMasks(roi_ids,
+                             np.concatenate(l_xx).astype(np.int32) if l_xx else np.zeros(0, dtype=np.int32),
+                             np.concatenate(l_yy).astype(np.int32) if l_yy else np.zeros(0, dtype=np.int32),
+                             offsets, shape)
+        if cache_file is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(cache_file, roi_ids=np.array(roi_masks.roi_ids), pixels_x=roi_masks.pixels_x,
+                     pixels_y=roi_masks.pixels_y, offsets=roi_masks.offsets)
+    _ROI_CACHE[key] = roi_masks
+    return roi_masks
@@ -0,0 +1,202 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import warnings
+
+import pandas as pd
+
+
+# Sheets of the AllData workbook that are used by the converter
+ALLDATA_SHEETS = ['Tracking', 'Behaviour', 'CAI - ROIS', 'CAI - Traces', 'HeartRate']
+
+
+def get_source_signature(filepath):
+    stat = os.stat(filepath)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def get_sidecar_dir(filepath, cache_dir=None):
+    # By default, sidecars are stored in a hidden directory next to the source file. The hash of the absolute path
+    # keeps files with the same name (e.g. States_ceiling_reduced.csv of each session) apart in a shared cache_dir.
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filepath)), '.eln2nwb_cache')
+    path_hash = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, '{}.{}.sidecar'.format(os.path.basename(filepath), path_hash))
+
+
+def parquet_available():
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        return False
+
+
+def read_manifest(sidecar_dir):
+    manifest_path = os.path.join(sidecar_dir, 'manifest.json')
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def write_manifest(sidecar_dir, manifest):
+    with open(os.path.join(sidecar_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def get_sheet_filename(sheet_name):
+    return '{}.parquet'.format(sheet_name.replace(' ', '_').replace('/', '_'))
+
+
+def update_sidecars(filepath, sheet_names, cache_dir=None):
+    '''
+    Converts all requested sheets that lack an up-to-date Parquet sidecar, parsing the workbook only once.
+    :return: the sidecar manifest, and a dict with the DataFrames of the sheets that were parsed from the workbook
+    '''
+    sidecar_dir = get_sidecar_dir(filepath, cache_dir)
+    signature = get_source_signature(filepath)
+    manifest = read_manifest(sidecar_dir)
+    if manifest.get('source') != signature:
+        manifest = {'source': signature, 'sheets': {}}
+
+    d_dfs_excel = {}
+    l_missing_sheets = [sheet_name for sheet_name in sheet_names if sheet_name not in manifest['sheets']]
+    if len(l_missing_sheets) > 0:
+        d_dfs_excel = pd.read_excel(filepath, sheet_name=l_missing_sheets)
+        try:
+            os.makedirs(sidecar_dir, exist_ok=True)
+            for sheet_name, df in d_dfs_excel.items():
+                # Parquet requires string column names, other sheets are not cached
+                if all(isinstance(column, str) for column in df.columns):
+                    df.to_parquet(os.path.join(sidecar_dir, get_sheet_filename(sheet_name)), index=False)
+                    manifest['sheets'][sheet_name] = get_sheet_filename(sheet_name)
+            write_manifest(sidecar_dir, manifest)
+        except OSError as e:
+            warnings.warn('Could not write sidecar cache for {}: {}'.format(filepath, e))
+    return manifest, d_dfs_excel
+
+
+def select_columns(df, columns=None):
+    if columns is None:
+        return df
+    return df[list(columns)]
+
+
+class LazyWorkbook:
+    '''
+    Dict-like access to the sheets of an Excel workbook, which loads a sheet only when it is first accessed,
+    with only the columns that are given for it, and which can release it again once it is no longer needed:
+        workbook = LazyWorkbook(filepath, ALLDATA_SHEETS, columns={'Tracking': ['Times', 'CenterG_X', 'CenterG_Y']})
+        df_tracking = workbook['Tracking']
+        workbook.release('Tracking')
+    With Parquet sidecars (see update_sidecars), the workbook is parsed at most once (by prepare) and the
+    sheets are loaded column-selectively from their sidecars. Without them, the workbook is opened once and
+    each sheet is parsed from it when accessed.
+    '''
+    def __init__(self, filepath, sheet_names, columns={}, cache_dir=None, use_sidecar=True, profiler=None):
+        self.filepath = filepath
+        # Parsing is recorded as 'excel_load' stage of the profiler (see instrumentation.Profiler), wherever sheets are accessed
+        self.profiler = profiler
+        self.sheet_names = list(sheet_names)
+        self.columns = dict(columns)
+        self.cache_dir = cache_dir
+        self.use_sidecar = use_sidecar and parquet_available()
+        self.manifest = None
+        self.excel_file = None
+        self.d_dfs = {}
+        self.d_loaded_columns = {}
+
+    def prepare(self):
+        if self.use_sidecar and self.manifest is None:
+            self.manifest, d_dfs_excel = update_sidecars(self.filepath, self.sheet_names, self.cache_dir)
+            # Parsed sheets are not kept, they are loaded from the sidecars when needed
+            del d_dfs_excel
+
+    def get(self, sheet_name, columns=None):
+        '''
+        :param sheet_name: string, name of the sheet
+        :param columns: list of strings, columns to load, defaults to the columns given for this sheet (or all columns)
+        :return: pandas.DataFrame
+        '''
+        if columns is None:
+            columns = self.columns.get(sheet_name)
+        if sheet_name in self.d_dfs:
+            loaded_columns = self.d_loaded_columns[sheet_name]
+            if loaded_columns is None or (columns is not None and set(columns).issubset(loaded_columns)):
+                return select_columns(self.d_dfs[sheet_name], columns)
+        with self.profiler.stage('excel_load') if self.profiler is not None else contextlib.nullcontext():
+            self.prepare()
+            if self.use_sidecar and sheet_name in self.manifest['sheets']:
+                df = pd.read_parquet(os.path.join(get_sidecar_dir(self.filepath, self.cache_dir), self.manifest['sheets'][sheet_name]),
+                                     columns=list(columns) if columns is not None else None)
+            else:
+                if self.excel_file is None:
+                    self.excel_file = pd.ExcelFile(self.filepath)
+                df = pd.read_excel(self.excel_file, sheet_name=sheet_name, usecols=list(columns) if columns is not None else None)
+        self.d_dfs[sheet_name] = df
+        self.d_loaded_columns[sheet_name] = list(columns) if columns is not None else None
+        return df
+
+    def __getitem__(self, sheet_name):
+        return self.get(sheet_name)
+
+    def release(self, sheet_name):
+        self.d_dfs.pop(sheet_name, None)
+        self.d_loaded_columns.pop(sheet_name, None)
+
+
+def build_partitioned_sidecar(filepath, dataset_dir, partition_cols, chunksize=1000000):
+    # The csv is streamed in chunks, so that building the sidecar does not require the whole table in memory
+    if os.path.isdir(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    os.makedirs(dataset_dir)
+    n_rows = 0
+    for df_chunk in pd.read_csv(filepath, index_col=0, chunksize=chunksize):
+        # Row numbers preserve the original order, which is not guaranteed when reading the partitions
+        df_chunk = df_chunk.reset_index(drop=True)
+        df_chunk['_row'] = range(n_rows, n_rows + df_chunk.shape[0])
+        n_rows += df_chunk.shape[0]
+        df_chunk.to_parquet(dataset_dir, partition_cols=partition_cols, index=False)
+
+
+def read_partitioned_csv(filepath, d_filters, columns, cache_dir=None):
+    '''
+    Reads the rows of a large csv table (e.g. States_ceiling_reduced.csv) that match all d_filters. On first read,
+    the table is converted into a Parquet dataset that is partitioned by the filter columns, so that later reads
+    only touch the matching partition. The sidecar is invalidated when size or modification time of the csv change.
+    Without pyarrow, the csv is scanned in chunks instead.
+    :param filepath: string, path to the csv table
+    :param d_filters: dict, maps column names to the value that rows have to match (e.g. {'Animal_ID': ..., 'Session': ...})
+    :param columns: list of strings, columns to load
+    :param cache_dir: string, directory in which the sidecars are stored, defaults to '.eln2nwb_cache' next to the table
+    :return: pandas.DataFrame with the matching rows and the requested columns
+    '''
+    partition_cols = list(d_filters.keys())
+    if not parquet_available():
+        l_matches = []
+        for df_chunk in pd.read_csv(filepath, usecols=lambda column: column in partition_cols + list(columns), chunksize=1000000):
+            match = pd.Series(True, index=df_chunk.index)
+            for column, value in d_filters.items():
+                match &= df_chunk[column] == value
+            l_matches.append(df_chunk.loc[match, list(columns)])
+        return pd.concat(l_matches, ignore_index=True)
+
+    sidecar_dir = get_sidecar_dir(filepath, cache_dir)
+    dataset_name = 'partitioned_by_{}'.format('_'.join(partition_cols))
+    dataset_dir = os.path.join(sidecar_dir, dataset_name)
+    signature = get_source_signature(filepath)
+    manifest = read_manifest(sidecar_dir)
+    if manifest.get('source') != signature or dataset_name not in manifest.get('partitioned', []):
+        os.makedirs(sidecar_dir, exist_ok=True)
+        build_partitioned_sidecar(filepath, dataset_dir, partition_cols)
+        if manifest.get('source') != signature:
+            manifest = {'source': signature, 'sheets': {}}
+        manifest['partitioned'] = manifest.get('partitioned', []) + [dataset_name]
+        write_manifest(sidecar_dir, manifest)
+
+    filters = [(column, '==', value) for column, value in d_filters.items()]
+    df = pd.read_parquet(dataset_dir, columns=list(columns) + ['_row'], filters=filters)
+    return df.sort_values('_row').drop(columns='_row').reset_index(drop=True)
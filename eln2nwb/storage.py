@@ -0,0 +1,163 @@
+import numpy as np
+
+from hdmf.backends.hdf5.h5_utils import H5DataIO
+from hdmf.utils import get_data_shape
+
+
+# 'hdf5' writes a single .nwb file, 'zarr' an NWB-Zarr store (a directory), which requires hdmf-zarr
+BACKENDS = ['hdf5', 'zarr']
+DEFAULT_BACKEND = 'hdf5'
+
+
+# Size of HDF5's default chunk cache (per dataset)
+CHUNK_CACHE_BYTES = 2**20
+
+
+# Storage options per series. 'chunks' gives the chunk shape per axis, None spans the full axis.
+# Chunks should stay below HDF5's default chunk cache of 1 MB, e.g. one 348 x 385 float32 CaI frame is about 0.5 MB,
+# larger chunks are shrunk to fit (see get_chunk_shape).
+# 'compression' can be 'gzip', 'lzf', 'blosc' or 'zstd' (the latter two require hdf5plugin,
+# which then also has to be imported when the file is read).
+DEFAULT_STORAGE_POLICY = {'CaI': {'chunks': (1, None, None), 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True},
+                          'RoiResponseSeries': {'chunks': (4096, 32), 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True},
+                          'SpatialSeries': {'chunks': (8192, None), 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True},
+                          'TimeSeries': {'chunks': (8192,), 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True},
+                          'timestamps': {'chunks': (8192,), 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True},
+                          'image_mask': {'chunks': (1, None, None), 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True},
+                          'pixel_mask': {'chunks': (65536, ), 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}}
+
+
+def get_storage_options(params, key):
+    '''
+    Returns the storage options for a series, where params['storage_policy'] can override
+    (or, with None, disable) the defaults of DEFAULT_STORAGE_POLICY per series.
+    '''
+    user_policy = params.get('storage_policy', {})
+    if key in user_policy:
+        if user_policy[key] is None:
+            return None
+        options = DEFAULT_STORAGE_POLICY.get(key, {}).copy()
+        options.update(user_policy[key])
+        return options
+    return DEFAULT_STORAGE_POLICY.get(key)
+
+
+def get_chunk_shape(chunks, shape, dtype=None, max_bytes=CHUNK_CACHE_BYTES):
+    # Without a known dtype (e.g. table columns that are filled row by row), 8 bytes per element are assumed
+    if chunks is None or len(shape) == 0 or 0 in shape:
+        return None
+    chunks = tuple(chunks) + (None, ) * (len(shape) - len(chunks))
+    chunk_shape = [min(shape[axis], chunks[axis]) if chunks[axis] is not None else shape[axis] for axis in range(len(shape))]
+    itemsize = np.dtype(dtype).itemsize if dtype is not None else 8
+    # Halves the first axis that spans more than one element until a chunk fits into the chunk cache
+    while int(np.prod(chunk_shape)) * itemsize > max_bytes and max(chunk_shape) > 1:
+        axis = next(axis for axis, size in enumerate(chunk_shape) if size > 1)
+        chunk_shape[axis] = (chunk_shape[axis] + 1) // 2
+    return tuple(chunk_shape)
+
+
+def get_compression_kwargs(options):
+    compression = options.get('compression')
+    compression_opts = options.get('compression_opts')
+    shuffle = options.get('shuffle', False)
+    if compression in [None, 'gzip']:
+        return {'compression': compression, 'compression_opts': compression_opts, 'shuffle': shuffle}
+    elif compression == 'lzf':
+        return {'compression': compression, 'shuffle': shuffle}
+    import hdf5plugin
+    if compression == 'blosc':
+        hdf5_filter = hdf5plugin.Blosc(cname=options.get('cname', 'zstd'),
+                                       clevel=compression_opts if compression_opts is not None else 5,
+                                       shuffle=hdf5plugin.Blosc.SHUFFLE if shuffle else hdf5plugin.Blosc.NOSHUFFLE)
+        shuffle = False
+    elif compression == 'zstd':
+        hdf5_filter = hdf5plugin.Zstd(clevel=compression_opts if compression_opts is not None else 3)
+    else:
+        raise ValueError('Unknown compression filter: {}'.format(compression))
+    return {'compression': hdf5_filter.filter_id,
+            'compression_opts': hdf5_filter.filter_options,
+            'allow_plugin_filters': True,
+            'shuffle': shuffle}
+
+
+def get_zarr_compression_kwargs(options, dtype=None):
+    # Same policy as for HDF5, expressed with numcodecs codecs
+    import numcodecs
+    compression = options.get('compression')
+    compression_opts = options.get('compression_opts')
+    shuffle = options.get('shuffle', False)
+    if compression is None:
+        compressor = None
+    elif compression == 'gzip':
+        compressor = numcodecs.GZip(level=compression_opts if compression_opts is not None else 4)
+    elif compression == 'lzf':
+        # LZF is not available for Zarr, LZ4 is the closest fast codec
+        compressor = numcodecs.Blosc(cname='lz4', clevel=5, shuffle=numcodecs.Blosc.SHUFFLE if shuffle else numcodecs.Blosc.NOSHUFFLE)
+        shuffle = False
+    elif compression == 'blosc':
+        compressor = numcodecs.Blosc(cname=options.get('cname', 'zstd'),
+                                     clevel=compression_opts if compression_opts is not None else 5,
+                                     shuffle=numcodecs.Blosc.SHUFFLE if shuffle else numcodecs.Blosc.NOSHUFFLE)
+        shuffle = False
+    elif compression == 'zstd':
+        compressor = numcodecs.Zstd(level=compression_opts if compression_opts is not None else 3)
+    else:
+        raise ValueError('Unknown compression filter: {}'.format(compression))
+    filters = None
+    if shuffle and dtype is not None and np.dtype(dtype).fields is None:
+        filters = [numcodecs.Shuffle(elementsize=np.dtype(dtype).itemsize)]
+    return {'compressor': compressor, 'filters': filters}
+
+
+def get_backend(params):
+    backend = params.get('backend', DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend: {}, choose from: {}'.format(backend, ', '.join(BACKENDS)))
+    return backend
+
+
+def get_data_io_class(params):
+    if get_backend(params) == 'zarr':
+        from hdmf_zarr import ZarrDataIO
+        return ZarrDataIO
+    return H5DataIO
+
+
+def get_data_io_kwargs(params, key, shape, dtype=None):
+    options = get_storage_options(params, key)
+    if options is None:
+        return None
+    if get_backend(params) == 'zarr':
+        data_io_kwargs = get_zarr_compression_kwargs(options, dtype)
+    else:
+        data_io_kwargs = get_compression_kwargs(options)
+    data_io_kwargs['chunks'] = get_chunk_shape(options.get('chunks'), shape, dtype)
+    return data_io_kwargs
+
+
+def wrap_data(data, key, params):
+    '''
+    Wraps data in H5DataIO (or, with params['backend'] = 'zarr', in ZarrDataIO) according to the storage policy of the given series.
+    :param data: array-like or DataChunkIterator to be written
+    :param key: string, key of the series in the storage policy (e.g. 'CaI' or 'RoiResponseSeries')
+    :param params: dict, conversion parameters that may contain a 'storage_policy' and the 'backend'
+    :return: H5DataIO or ZarrDataIO, or the data itself if no policy applies
+    '''
+    if hasattr(data, 'maxshape'):
+        shape = data.maxshape
+    else:
+        shape = get_data_shape(data)
+    data_io_kwargs = get_data_io_kwargs(params, key, shape, getattr(data, 'dtype', None))
+    if data_io_kwargs is None:
+        return data
+    return get_data_io_class(params)(data=data, **data_io_kwargs)
+
+
+def set_column_storage(column, key, params, shape=None, dtype=None):
+    # Columns of DynamicTables (e.g. the ROI masks) are filled row by row and can only be wrapped afterwards.
+    # Compound columns like the pixel masks need their (1-D) shape to be passed explicitly.
+    if shape is None:
+        shape = get_data_shape(column.data)
+    data_io_kwargs = get_data_io_kwargs(params, key, shape, dtype)
+    if data_io_kwargs is not None:
+        column.set_data_io(get_data_io_class(params), data_io_kwargs)
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+# Offsets to the neighboring pixels that are not yet covered by the opposite direction (8-neighborhood)
+NEIGHBOR_OFFSETS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+
+def get_pair_slices(offset, shape):
+    # Slices of all pixels p and their neighbors q = p + offset
+    dy, dx = offset
+    p = (slice(0, shape[0] - dy), slice(max(-dx, 0), shape[1] - max(dx, 0)))
+    q = (slice(dy, shape[0]), slice(max(dx, 0), shape[1] - max(-dx, 0)))
+    return p, q
+
+
+class SummaryImageAccumulator:
+    '''
+    Computes mean, max-projection and local correlation image (mean correlation of each pixel's trace with
+    its 8 neighbors) of a movie in a single pass over blocks of frames, so that the movie never has to be
+    held in memory at once.
+    '''
+    def __init__(self, frame_shape):
+        self.frame_shape = tuple(frame_shape)
+        self.n_frames = 0
+        self.sum = np.zeros(self.frame_shape)
+        self.sum_of_squares = np.zeros(self.frame_shape)
+        self.max = np.full(self.frame_shape, -np.inf)
+        self.d_sum_of_products = {}
+        for offset in NEIGHBOR_OFFSETS:
+            p, q = get_pair_slices(offset, self.frame_shape)
+            self.d_sum_of_products[offset] = np.zeros(self.sum[p].shape)
+
+    def update(self, frames):
+        frames = np.asarray(frames, dtype=np.float32)
+        self.n_frames += frames.shape[0]
+        self.sum += frames.sum(axis=0, dtype=np.float64)
+        self.sum_of_squares += np.square(frames).sum(axis=0, dtype=np.float64)
+        np.maximum(self.max, frames.max(axis=0), out=self.max)
+        for offset in NEIGHBOR_OFFSETS:
+            p, q = get_pair_slices(offset, self.frame_shape)
+            self.d_sum_of_products[offset] += (frames[(slice(None), ) + p] * frames[(slice(None), ) + q]).sum(axis=0, dtype=np.float64)
+
+    def mean_image(self):
+        return self.sum / max(self.n_frames, 1)
+
+    def max_image(self):
+        return self.max
+
+    def correlation_image(self):
+        mean = self.mean_image()
+        std = np.sqrt(np.maximum(self.sum_of_squares / max(self.n_frames, 1) - np.square(mean), 0))
+        sum_of_correlations = np.zeros(self.frame_shape)
+        n_neighbors = np.zeros(self.frame_shape)
+        for offset, sum_of_products in self.d_sum_of_products.items():
+            p, q = get_pair_slices(offset, self.frame_shape)
+            covariance = sum_of_products / max(self.n_frames, 1) - mean[p] * mean[q]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                correlation = np.nan_to_num(covariance / (std[p] * std[q]))
+            sum_of_correlations[p] += correlation
+            sum_of_correlations[q] += correlation
+            n_neighbors[p] += 1
+            n_neighbors[q] += 1
+        return sum_of_correlations / n_neighbors
+
+
+def compute_summary_images(dataset, buffer_gb=1.0):
+    '''
+    :param dataset: h5py.Dataset (or array), movie with the shape frames x height x width
+    :param buffer_gb: float, maximum size of one block of frames that is read at once
+    :return: mean, max-projection and local correlation image
+    '''
+    frame_nbytes = int(np.prod(dataset.shape[1:])) * 4
+    n_frames_per_block = max(int(buffer_gb * 1e9 // max(frame_nbytes, 1)), 1)
+    accumulator = SummaryImageAccumulator(dataset.shape[1:])
+    for start in range(0, dataset.shape[0], n_frames_per_block):
+        accumulator.update(dataset[start:min(start + n_frames_per_block, dataset.shape[0])])
+    return accumulator.mean_image(), accumulator.max_image(), accumulator.correlation_image()
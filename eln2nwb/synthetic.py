@@ -0,0 +1,133 @@
+import os
+
+import numpy as np
+import pandas as pd
+import h5py
+
+from eln2nwb import rois
+
+
+# Scales of the synthetic datasets: number of movie frames, ROIs, scored behavioral events and animals in the thermal table
+SCALES = {'small': {'n_frames': 500, 'n_rois': 30, 'n_events': 100, 'n_animals': 5},
+          'medium': {'n_frames': 5000, 'n_rois': 150, 'n_events': 1000, 'n_animals': 20},
+          'large': {'n_frames': 30000, 'n_rois': 500, 'n_events': 5000, 'n_animals': 60}}
+
+BEHAVIORS = ['Freezing', 'Rearing', 'Grooming', 'Darting']
+
+
+def create_roi_sheet(rng, n_rois, frame_shape=rois.FRAME_SHAPE, n_vertices_max=40):
+    # Roughly circular contours of varying size and vertex count, padded with NaNs like in the AllData workbook
+    d_columns = {}
+    for idx in range(n_rois):
+        n_vertices = rng.integers(12, n_vertices_max + 1)
+        radius = rng.uniform(4, 12)
+        center_x = rng.uniform(radius, frame_shape[0] - radius)
+        center_y = rng.uniform(radius, frame_shape[1] - radius)
+        angles = np.linspace(0, 2*np.pi, n_vertices, endpoint=False)
+        x, y = np.full(n_vertices_max, np.nan), np.full(n_vertices_max, np.nan)
+        x[:n_vertices] = center_x + radius * np.cos(angles) * rng.uniform(0.8, 1.2, n_vertices)
+        y[:n_vertices] = center_y + radius * np.sin(angles) * rng.uniform(0.8, 1.2, n_vertices)
+        d_columns['C{:04d}_X'.format(idx)] = x
+        d_columns['C{:04d}_Y'.format(idx)] = y
+    return pd.DataFrame(d_columns)
+
+
+def create_behaviour_sheet(rng, n_events, duration):
+    # <behavior>_1 / <behavior>_2 columns with start and stop times, padded with NaNs
+    l_n_events = rng.multinomial(n_events, [1 / len(BEHAVIORS)] * len(BEHAVIORS))
+    n_rows = max(l_n_events.max(), 1)
+    d_columns = {}
+    for behavior, n_behavior_events in zip(BEHAVIORS, l_n_events):
+        starts, stops = np.full(n_rows, np.nan), np.full(n_rows, np.nan)
+        starts[:n_behavior_events] = np.sort(rng.uniform(0, duration, n_behavior_events))
+        stops[:n_behavior_events] = starts[:n_behavior_events] + rng.uniform(0.5, 5, n_behavior_events)
+        d_columns['{}_1'.format(behavior)] = starts
+        d_columns['{}_2'.format(behavior)] = stops
+    return pd.DataFrame(d_columns)
+
+
+def create_thermal_table(rng, n_animals, animal_id, duration, rate=1.):
+    # One (irregularly sampled) trace per animal and session, as in States_ceiling_reduced.csv
+    l_dfs = []
+    l_animal_ids = [animal_id] + ['175_F{}-{}'.format(idx // 100, idx % 100) for idx in range(1, n_animals)]
+    for animal in l_animal_ids:
+        for session in ['OF', 'EPM', 'CD1', 'CD2']:
+            times = np.cumsum(rng.uniform(0.5 / rate, 1.5 / rate, int(duration * rate)))
+            l_dfs.append(pd.DataFrame({'Animal_ID': animal,
+                                       'Session': session,
+                                       'Times': times,
+                                       'Temperature': 33 + np.cumsum(rng.normal(0, 0.01, len(times)))}))
+    return pd.concat(l_dfs, ignore_index=True)
+
+
+def write_movie(filepath, rng, n_frames, frame_shape=rois.FRAME_SHAPE, block_size=500):
+    # Written block by block, so that large movies do not have to fit into memory
+    with h5py.File(filepath, 'w') as f:
+        mov = f.create_dataset('mov', shape=(n_frames, ) + tuple(frame_shape), dtype=np.float32, chunks=(1, ) + tuple(frame_shape))
+        background = rng.uniform(100, 200, frame_shape).astype(np.float32)
+        for start in range(0, n_frames, block_size):
+            stop = min(start + block_size, n_frames)
+            mov[start:stop] = background + rng.normal(0, 10, (stop - start, ) + tuple(frame_shape)).astype(np.float32)
+
+
+def create_metadata():
+    # ELN metadata as retrieved by eln2widget.States
+    injection = {'date': '2020-08-14', 'experimenter': 'Synthetic Experimenter', 'procedure': 'Virus injection',
+                 'mouse_id': '175_F7-49', 'genotype': 'wildtype', 'sex': 'F', 'date_of_birth': '2020-05-02',
+                 'bodyweight': 20, 'viral_construct': 'AAV5-hSyn-GCaMP6f', 'target_region': 'PAG',
+                 'AP': '-4.5', 'ML': '0.5', 'DV': '-2.5'}
+    implantation = {'date': '2020-08-28', 'experimenter': 'Synthetic Experimenter', 'procedure': 'GRIN lens implantation',
+                    'mouse_id': '175_F7-49', 'genotype': 'wildtype', 'sex': 'F', 'date_of_birth': '2020-05-02',
+                    'bodyweight': 21, 'implanted_item': 'GRIN lens', 'target_region': 'PAG',
+                    'AP': '-4.5', 'ML': '0.5', 'DV': '-2.3'}
+    return injection, implantation
+
+
+def generate_session(output_dir, n_frames=1000, n_rois=50, n_events=200, n_animals=10, imaging_rate=10., seed=0):
+    '''
+    Writes a synthetic session with the same files, sheet names and column conventions as the recorded data:
+    the AllData workbook, the motion corrected movie and the thermal table of the cohort.
+    :param output_dir: string, directory in which the session is created
+    :param n_frames: int, number of frames of the movie (and of samples of the fluorescence traces)
+    :param n_rois: int, number of ROIs
+    :param n_events: int, number of scored behavioral events
+    :param n_animals: int, number of animals in the thermal table
+    :param imaging_rate: float, frame rate of the movie in Hz
+    :return: dict, params for convert2nwb.convert_states (including synthetic ELN metadata)
+    '''
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    duration = n_frames / imaging_rate
+    frame_times = np.arange(n_frames) / imaging_rate
+
+    df_rois = create_roi_sheet(rng, n_rois)
+    l_roi_ids = [column[:-2] for column in df_rois.columns[::2]]
+    d_traces = {'Times': frame_times}
+    for roi_id in l_roi_ids:
+        d_traces[roi_id] = 100 + rng.gamma(1, 5, n_frames).cumsum() % 50
+    n_tracking = int(duration * 30)
+    d_sheets = {'Tracking': pd.DataFrame({'Times': np.arange(n_tracking) / 30.,
+                                          'CenterG_X': rng.normal(0, 1, n_tracking).cumsum(),
+                                          'CenterG_Y': rng.normal(0, 1, n_tracking).cumsum()}),
+                'Behaviour': create_behaviour_sheet(rng, n_events, duration),
+                'CAI - ROIS': df_rois,
+                'CAI - Traces': pd.DataFrame(d_traces),
+                'HeartRate': pd.DataFrame({'Times': np.sort(rng.uniform(0, duration, int(duration * 8))),
+                                           'HeartRate': rng.normal(600, 30, int(duration * 8))})}
+
+    # pandas cannot write the legacy .xls format, but reads workbooks by their content, not their file extension
+    alldata_filepath = os.path.join(output_dir, '175_F7-49_201030_OF_AllData.xls')
+    with pd.ExcelWriter(alldata_filepath + 'x', engine='openpyxl') as writer:
+        for sheet_name, df in d_sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    os.replace(alldata_filepath + 'x', alldata_filepath)
+
+    write_movie(os.path.join(output_dir, '175_F7-49_201030_OF_PP-1_PF-1_MC-1.h5'), rng, n_frames)
+    create_thermal_table(rng, n_animals, '175_F4-37', duration).to_csv(os.path.join(output_dir, 'States_ceiling_reduced.csv'))
+
+    injection, implantation = create_metadata()
+    return {'file_dir': output_dir,
+            'session_description': 'open field',
+            'session_id': 'OF',
+            'injection': injection,
+            'implantation': implantation}
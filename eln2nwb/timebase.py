@@ -0,0 +1,122 @@
+import hashlib
+
+import numpy as np
+
+from pynwb import TimeSeries
+
+
+def get_regular_rate(timestamps, tolerance):
+    '''
+    Checks whether timestamps are uniformly sampled.
+    :param timestamps: array, timestamps in seconds
+    :param tolerance: float, maximal deviation of any timestamp from the uniform grid, as fraction of the sampling period
+    :return: (starting_time, rate) if the timestamps are uniformly sampled, else None
+    '''
+    timestamps = np.asarray(timestamps, dtype=float)
+    if timestamps.ndim != 1 or len(timestamps) < 2 or not np.all(np.isfinite(timestamps)):
+        return None
+    period = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
+    if period <= 0:
+        return None
+    deviation = np.abs(timestamps - (timestamps[0] + period * np.arange(len(timestamps))))
+    if deviation.max() <= tolerance * period:
+        return float(timestamps[0]), 1. / period
+    return None
+
+
+def find_nearest(array, value):
+    '''
+    Finds the index of the element of the sorted array that is nearest to value, for a single value
+    as well as for a whole array of values at once. Ties resolve to the later element.
+    :param array: 1D array, sorted in ascending order (e.g. the timestamps of the imaging frames)
+    :param value: float or array of floats
+    :return: int, or array of ints with the shape of value. NaN values are mapped to -1.
+    '''
+    array = np.asarray(array)
+    values = np.asarray(value, dtype=float)
+    idx = np.searchsorted(array, values, side="left")
+    idx_before = np.clip(idx - 1, 0, len(array) - 1)
+    idx_after = np.clip(idx, 0, len(array) - 1)
+    with np.errstate(invalid='ignore'):
+        use_before = (idx > 0) & ((idx == len(array)) | (np.abs(values - array[idx_before]) < np.abs(values - array[idx_after])))
+    nearest = np.where(np.isnan(values), -1, np.where(use_before, idx - 1, idx))
+    if nearest.ndim == 0:
+        return int(nearest)
+    return nearest
+
+
+def get_bin_edges(target_timestamps):
+    # Each target sample covers the time from halfway to its predecessor to halfway to its successor
+    target_timestamps = np.asarray(target_timestamps, dtype=float)
+    if len(target_timestamps) < 2:
+        return np.array([-np.inf, np.inf])[:len(target_timestamps) + 1]
+    midpoints = (target_timestamps[1:] + target_timestamps[:-1]) / 2
+    first_edge = target_timestamps[0] - (midpoints[0] - target_timestamps[0])
+    last_edge = target_timestamps[-1] + (target_timestamps[-1] - midpoints[-1])
+    return np.concatenate([[first_edge], midpoints, [last_edge]])
+
+
+def resample(timestamps, data, target_timestamps, method='linear'):
+    '''
+    Resamples a series onto other timestamps (e.g. those of the imaging frames), for all columns of data at once.
+    :param timestamps: 1D array, sorted timestamps of the series in seconds
+    :param data: 1D or 2D array, samples of the series (samples x columns)
+    :param target_timestamps: 1D array, sorted timestamps to resample onto
+    :param method: string, 'linear' (interpolation), 'nearest' (nearest sample) or 'bin_mean' (mean of all samples
+                   within each target sample's bin, which reaches halfway to the neighboring target samples)
+    :return: float array with len(target_timestamps) samples and the columns of data. Target samples outside of
+             the recorded time range (or, with 'bin_mean', without any samples in their bin) are NaN.
+    '''
+    timestamps = np.asarray(timestamps, dtype=float)
+    target_timestamps = np.asarray(target_timestamps, dtype=float)
+    data = np.asarray(data, dtype=float)
+    values = data.reshape(data.shape[0], -1)
+    resampled = np.full((len(target_timestamps), values.shape[1]), np.nan)
+    if len(timestamps) == 0:
+        return resampled.reshape((len(target_timestamps), ) + data.shape[1:])
+
+    if method == 'bin_mean':
+        edges = get_bin_edges(target_timestamps)
+        bins = np.searchsorted(edges, timestamps, side='right') - 1
+        in_bins = (bins >= 0) & (bins < len(target_timestamps))
+        for column in range(values.shape[1]):
+            valid = in_bins & ~np.isnan(values[:, column])
+            counts = np.bincount(bins[valid], minlength=len(target_timestamps))
+            sums = np.bincount(bins[valid], weights=values[valid, column], minlength=len(target_timestamps))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                resampled[:, column] = np.where(counts > 0, sums / counts, np.nan)
+    else:
+        in_range = (target_timestamps >= timestamps[0]) & (target_timestamps <= timestamps[-1])
+        if method == 'linear':
+            idx_before = np.clip(np.searchsorted(timestamps, target_timestamps, side='right') - 1, 0, len(timestamps) - 1)
+            idx_after = np.minimum(idx_before + 1, len(timestamps) - 1)
+            interval = timestamps[idx_after] - timestamps[idx_before]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weights = np.where(interval > 0, (target_timestamps - timestamps[idx_before]) / interval, 0.)
+            resampled[in_range] = (values[idx_before] * (1 - weights[:, np.newaxis]) + values[idx_after] * weights[:, np.newaxis])[in_range]
+        elif method == 'nearest':
+            resampled[in_range] = values[find_nearest(timestamps, target_timestamps[in_range])]
+        else:
+            raise ValueError('Unknown resampling method: {}'.format(method))
+    return resampled.reshape((len(target_timestamps), ) + data.shape[1:])
+
+
+class SharedTimestamps:
+    '''
+    Keeps track of the timestamps that were already written with a TimeSeries, so that further series
+    on the same clock can link to that series' timestamps instead of storing another copy.
+    '''
+    def __init__(self):
+        self.d_series = {}
+
+    def get_key(self, timestamps):
+        timestamps = np.ascontiguousarray(timestamps, dtype=float)
+        return hashlib.sha1(timestamps.tobytes()).hexdigest()
+
+    def get_series(self, timestamps):
+        return self.d_series.get(self.get_key(timestamps))
+
+    def register(self, timestamps, series):
+        # Only series that store the timestamps themselves can be linked to
+        if series.timestamps is not None and not isinstance(series.timestamps, TimeSeries):
+            self.d_series.setdefault(self.get_key(timestamps), series)
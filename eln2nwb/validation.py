@@ -0,0 +1,188 @@
+import re
+import traceback
+
+import numpy as np
+
+from hdmf.utils import get_data_shape
+from pynwb import NWBFile, ProcessingModule, TimeSeries, validate
+from pynwb.epoch import TimeIntervals
+from pynwb.ophys import RoiResponseSeries
+
+from eln2nwb import convert2nwb
+
+
+# Checks that are run after the NWB file was written, each in its own worker process (see submit_validation)
+VALIDATION_CHECKS = ['schema', 'best_practices', 'nwbinspector']
+
+SEVERITIES = ['error', 'warning', 'best practice']
+
+
+def create_finding(severity, location, message):
+    return {'severity': severity, 'location': location, 'message': message}
+
+
+def get_location(container):
+    # Path of a container in the file, e.g. processing/ophys/Fluorescence/included. The groups in which
+    # the NWBFile places its direct children (acquisition, processing, intervals, general) are not their parents.
+    l_names = []
+    while container is not None and container.parent is not None:
+        l_names.insert(0, container.name)
+        if isinstance(container.parent, NWBFile):
+            l_names.insert(0, get_group_name(container.parent, container))
+        container = container.parent
+    return '/'.join(l_names) if len(l_names) > 0 else '/'
+
+
+def get_group_name(nwbfile, container):
+    if isinstance(container, ProcessingModule):
+        return 'processing'
+    elif container.name in nwbfile.acquisition and nwbfile.acquisition[container.name] is container:
+        return 'acquisition'
+    elif isinstance(container, TimeIntervals):
+        return 'intervals'
+    return 'general'
+
+
+def check_schema(filepath):
+    # pynwb.validate only reads HDF5 files, NWB-Zarr stores are checked by check_best_practices only
+    if convert2nwb.is_zarr_store(filepath):
+        return []
+    with convert2nwb.open_nwbfile(filepath) as io:
+        errors = validate(io=io)
+    # Newer versions of pynwb also return the status
+    if isinstance(errors, tuple):
+        errors = errors[0]
+    return [create_finding('error', getattr(error, 'location', None) or '/', str(error)) for error in errors]
+
+
+def check_file_metadata(nwbfile):
+    l_findings = []
+    if nwbfile.session_start_time.tzinfo is None:
+        l_findings.append(create_finding('error', '/', 'session_start_time has no time zone'))
+    for attribute in ['session_description', 'experimenter', 'institution', 'lab']:
+        if getattr(nwbfile, attribute) is None or len(getattr(nwbfile, attribute)) == 0:
+            l_findings.append(create_finding('best practice', '/', '{} is missing'.format(attribute)))
+    subject = nwbfile.subject
+    if subject is None:
+        l_findings.append(create_finding('warning', '/', 'the file has no subject'))
+        return l_findings
+    if subject.subject_id is None:
+        l_findings.append(create_finding('best practice', 'general/subject', 'subject_id is missing'))
+    if subject.species is None or re.fullmatch('[A-Z][a-z]+ [a-z]+', subject.species) is None:
+        l_findings.append(create_finding('best practice', 'general/subject', 'species should be the binomial name, not: {}'.format(subject.species)))
+    if subject.sex not in ['M', 'F', 'U', 'O']:
+        l_findings.append(create_finding('best practice', 'general/subject', 'sex should be one of M, F, U or O, not: {}'.format(subject.sex)))
+    if subject.age is None or re.fullmatch('P(\\d+Y)?(\\d+M)?(\\d+W)?(\\d+D)?(T.*)?', subject.age) is None or subject.age == 'P':
+        l_findings.append(create_finding('best practice', 'general/subject', 'age should be an ISO 8601 duration, not: {}'.format(subject.age)))
+    return l_findings
+
+
+def check_time_series(series):
+    # Only shapes and attributes are checked, the bulk data is not read
+    l_findings = []
+    location = get_location(series)
+    shape = get_data_shape(series.data)
+    if series.timestamps is not None:
+        timestamps = series.timestamps.timestamps if isinstance(series.timestamps, TimeSeries) else series.timestamps
+        n_timestamps = get_data_shape(timestamps)[0]
+        if shape is not None and len(shape) > 0 and shape[0] != n_timestamps:
+            l_findings.append(create_finding('error', location, 'data has {} samples, but there are {} timestamps'.format(shape[0], n_timestamps)))
+    elif series.rate is not None and series.rate <= 0:
+        l_findings.append(create_finding('error', location, 'rate has to be positive, not: {}'.format(series.rate)))
+    if series.unit is None or len(series.unit) == 0:
+        l_findings.append(create_finding('warning', location, 'unit is missing'))
+    if series.description in [None, '', 'no description']:
+        l_findings.append(create_finding('best practice', location, 'description is missing'))
+    if isinstance(series, RoiResponseSeries) and shape is not None and len(shape) > 1 and shape[1] != len(series.rois):
+        l_findings.append(create_finding('error', location, 'data has {} columns, but refers to {} ROIs'.format(shape[1], len(series.rois))))
+    return l_findings
+
+
+def check_time_intervals(time_intervals):
+    # Interval tables are small, so their start and stop times are read
+    l_findings = []
+    if len(time_intervals) == 0:
+        return [create_finding('warning', get_location(time_intervals), 'the table has no intervals')]
+    start_times = np.asarray(time_intervals['start_time'].data[:], dtype=float)
+    stop_times = np.asarray(time_intervals['stop_time'].data[:], dtype=float)
+    with np.errstate(invalid='ignore'):
+        n_reversed = int(np.sum(stop_times < start_times))
+    if n_reversed > 0:
+        l_findings.append(create_finding('error', get_location(time_intervals), '{} intervals stop before they start'.format(n_reversed)))
+    if np.isnan(stop_times).any():
+        l_findings.append(create_finding('warning', get_location(time_intervals), '{} intervals have no stop time'.format(int(np.isnan(stop_times).sum()))))
+    return l_findings
+
+
+def check_best_practices(nwbfile):
+    '''
+    NWB Inspector-style checks of the metadata and of the dataset shapes of an NWBFile.
+    :return: list of findings, dicts with 'severity' (see SEVERITIES), 'location' and 'message'
+    '''
+    l_findings = check_file_metadata(nwbfile)
+    for container in nwbfile.objects.values():
+        if isinstance(container, TimeSeries):
+            l_findings += check_time_series(container)
+        elif isinstance(container, TimeIntervals):
+            l_findings += check_time_intervals(container)
+    return l_findings
+
+
+def check_nwbinspector(filepath):
+    # The NWB Inspector is optional, and only reads HDF5 files
+    try:
+        from nwbinspector import inspect_nwbfile
+    except ImportError:
+        return []
+    if convert2nwb.is_zarr_store(filepath):
+        return []
+    l_findings = []
+    for message in inspect_nwbfile(nwbfile_path=filepath, skip_validate=True):
+        severity = 'error' if message.importance.name in ['CRITICAL', 'ERROR'] else 'best practice'
+        l_findings.append(create_finding(severity, message.location or '/', message.message))
+    return l_findings
+
+
+def run_check(filepath, check):
+    # Runs in a worker process, errors of the check itself are reported as finding
+    try:
+        if check == 'schema':
+            return check_schema(filepath)
+        elif check == 'best_practices':
+            with convert2nwb.open_nwbfile(filepath) as io:
+                return check_best_practices(io.read())
+        elif check == 'nwbinspector':
+            return check_nwbinspector(filepath)
+        raise ValueError('Unknown validation check: {}'.format(check))
+    except Exception:
+        return [create_finding('error', '/', 'Validation check {} failed: {}'.format(check, traceback.format_exc()))]
+
+
+def submit_validation(executor, filepath, l_checks=VALIDATION_CHECKS):
+    '''
+    Starts all checks of a saved NWB file in parallel, so that their findings can be shown as soon as each check finishes.
+    :param executor: concurrent.futures.ProcessPoolExecutor
+    :return: dict, maps the checks to futures of their lists of findings
+    '''
+    return {check: executor.submit(run_check, filepath, check) for check in l_checks}
+
+
+def collect_findings(d_futures):
+    # Waits for the checks started by submit_validation, a crashed worker is reported as finding
+    l_findings = []
+    for check, future in d_futures.items():
+        try:
+            l_findings += future.result()
+        except Exception:
+            l_findings.append(create_finding('error', '/', 'Validation check {} failed: {}'.format(check, traceback.format_exc())))
+    return l_findings
+
+
+def count_findings(l_findings):
+    return {severity: sum(finding['severity'] == severity for finding in l_findings) for severity in SEVERITIES}
+
+
+def findings_to_html(l_findings):
+    rows = ''.join('<tr><td>{}</td><td>{}</td><td>{}</td></tr>'.format(finding['severity'], finding['location'], finding['message'])
+                   for finding in sorted(l_findings, key=lambda finding: SEVERITIES.index(finding['severity'])))
+    return '<table><tr><th>Severity</th><th>Location</th><th>Message</th></tr>{}</table>'.format(rows)
@@ -0,0 +1,44 @@
+import os
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from eln2nwb import convert2nwb
+from eln2nwb import synthetic
+
+
+def get_chunk_offsets(dataset):
+    return [dataset.id.get_chunk_info(idx).byte_offset for idx in range(dataset.id.get_num_chunks())]
+
+
+def test_update_replaces_behavior_in_place(tmp_path):
+    params = synthetic.generate_session(str(tmp_path / 'session'), n_frames=100, n_rois=5, n_events=10, n_animals=2)
+    params['cache_dir'] = str(tmp_path / 'cache')
+    filepath = str(tmp_path / 'session.nwb')
+    convert2nwb.save_nwbfile(convert2nwb.convert_states(params), filepath)
+    convert2nwb.release_conversion(params)
+    with h5py.File(filepath, 'r') as h5file:
+        movie = h5file['/acquisition/CaI/data'][:]
+        chunk_offsets = get_chunk_offsets(h5file['/acquisition/CaI/data'])
+        position = h5file['/processing/behavior/Position/SpatialSeries/data'][:]
+
+    # Corrected tracking in the AllData workbook
+    alldata_filepath = convert2nwb.get_input_filepaths(params)['alldata_filepath']
+    d_sheets = pd.read_excel(alldata_filepath, sheet_name=None)
+    d_sheets['Tracking']['CenterG_X'] += 1
+    with pd.ExcelWriter(alldata_filepath + 'x', engine='openpyxl') as writer:
+        for sheet_name, df in d_sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    os.replace(alldata_filepath + 'x', alldata_filepath)
+
+    nwbfile = convert2nwb.convert_states(params, l_stages=['behavior'])
+    convert2nwb.update_nwbfile(nwbfile, filepath, l_module_names=['behavior'], l_interval_names=[])
+    convert2nwb.release_conversion(params)
+
+    with h5py.File(filepath, 'r') as h5file:
+        assert get_chunk_offsets(h5file['/acquisition/CaI/data']) == chunk_offsets
+        np.testing.assert_array_equal(h5file['/acquisition/CaI/data'][:], movie)
+        np.testing.assert_allclose(h5file['/processing/behavior/Position/SpatialSeries/data'][:, 0], position[:, 0] + 1)
+        assert 'ophys' in h5file['/processing'] and 'cardiac' in h5file['/processing']
+    assert not os.path.exists(convert2nwb.get_backup_filepath(filepath))